@@ -1,17 +1,25 @@
 """Expiry management API endpoints."""
 
+import asyncio
+import orjson
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Body, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 from datetime import date
 
-from app.database import get_database
+from app.database import AsyncSessionLocal, get_database, run_in_new_session
 from app.services.expiry_service import ExpiryService, ExpiryAlertLevel
 
 
 router = APIRouter()
 
+# Alert level filters used by the fixed endpoints below
+_CRITICAL_ONLY = (ExpiryAlertLevel.CRITICAL,)
+_HIGH_PRIO = (ExpiryAlertLevel.CRITICAL, ExpiryAlertLevel.HIGH)
+_DASHBOARD_LEVELS = (ExpiryAlertLevel.CRITICAL, ExpiryAlertLevel.HIGH, ExpiryAlertLevel.MEDIUM)
+
 
 class ExpiryAlertResponse(BaseModel):
     """Expiry alert response model."""
@@ -26,6 +34,9 @@ class ExpiryAlertResponse(BaseModel):
     estimated_value: float
     recommended_action: str
     priority_score: float
+    
+    class Config:
+        from_attributes = True
 
 
 class ExpirySummaryResponse(BaseModel):
@@ -37,51 +48,104 @@ class ExpirySummaryResponse(BaseModel):
     expired: dict
 
 
+_alerts_adapter = TypeAdapter(List[ExpiryAlertResponse])
+
+
 @router.get("/alerts", response_model=List[ExpiryAlertResponse])
 async def get_expiry_alerts(
     alert_levels: Optional[List[ExpiryAlertLevel]] = Query(None),
     min_quantity: int = Query(1, ge=0),
     include_expired: bool = Query(False),
+    limit: int = Query(200, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    after_score: Optional[float] = Query(None),
+    after_batch_id: Optional[int] = Query(None),
     db: AsyncSession = Depends(get_database)
 ):
     """
     Get expiry alerts with intelligent prioritization.
     
+    Returns at most `limit` alerts, 200 by default; earlier versions
+    returned every alert. Page with `after_score`/`after_batch_id`, or use
+    `/alerts/stream` to export them all.
+    
     - **alert_levels**: Filter by specific alert levels (critical, high, medium, low, info)
     - **min_quantity**: Minimum quantity threshold for alerts
     - **include_expired**: Include already expired items
+    - **limit** / **offset**: Page through the alerts (ordered by priority score, then batch id)
+    - **after_score** / **after_batch_id**: Continue after the last alert of the previous page
     """
+    if (after_score is None) != (after_batch_id is None):
+        raise HTTPException(status_code=400, detail="after_score and after_batch_id must be given together")
+    
     service = ExpiryService(db)
     
     try:
         alerts = await service.get_expiry_alerts(
             alert_levels=alert_levels,
             min_quantity=min_quantity,
-            include_expired=include_expired
+            include_expired=include_expired,
+            limit=limit,
+            offset=offset,
+            after=(after_score, after_batch_id) if after_score is not None else None
         )
         
-        return [ExpiryAlertResponse(**alert.__dict__) for alert in alerts]
+        return alerts
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/alerts/stream", response_model=List[ExpiryAlertResponse])
+async def stream_expiry_alerts(
+    alert_levels: Optional[List[ExpiryAlertLevel]] = Query(None),
+    min_quantity: int = Query(1, ge=0),
+    include_expired: bool = Query(False)
+):
+    """
+    Stream expiry alerts as a JSON array while rows are read.
+    
+    Intended for large exports: returns every matching alert, in the same
+    order as `/alerts`, without paging. Accepts the same filters.
+    """
+    async def generate():
+        # The request-scoped session may be closed before the body is sent,
+        # so the stream opens its own
+        async with AsyncSessionLocal() as session:
+            service = ExpiryService(session)
+            yield b"["
+            separator = b""
+            async for alerts in service.stream_expiry_alerts(
+                alert_levels=alert_levels,
+                min_quantity=min_quantity,
+                include_expired=include_expired
+            ):
+                if alerts:
+                    yield separator + b",".join(orjson.dumps(alert) for alert in alerts)
+                    separator = b","
+            yield b"]"
+    
+    return StreamingResponse(generate(), media_type="application/json")
+
+
 @router.get("/alerts/critical", response_model=List[ExpiryAlertResponse])
 async def get_critical_expiry_alerts(
     min_quantity: int = Query(1, ge=0),
     db: AsyncSession = Depends(get_database)
 ):
-    """Get only critical expiry alerts (1 week or less)."""
+    """Get all critical expiry alerts (1 week or less)."""
     service = ExpiryService(db)
     
     try:
+        # Every matching alert; unlike /alerts, this route is not paged
         alerts = await service.get_expiry_alerts(
-            alert_levels=[ExpiryAlertLevel.CRITICAL],
+            alert_levels=_CRITICAL_ONLY,
             min_quantity=min_quantity,
-            include_expired=False
+            include_expired=False,
+            limit=None
         )
         
-        return [ExpiryAlertResponse(**alert.__dict__) for alert in alerts]
+        return alerts
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -92,17 +156,19 @@ async def get_high_priority_expiry_alerts(
     min_quantity: int = Query(1, ge=0),
     db: AsyncSession = Depends(get_database)
 ):
-    """Get high priority expiry alerts (critical and high levels)."""
+    """Get all high priority expiry alerts (critical and high levels)."""
     service = ExpiryService(db)
     
     try:
+        # Every matching alert; unlike /alerts, this route is not paged
         alerts = await service.get_expiry_alerts(
-            alert_levels=[ExpiryAlertLevel.CRITICAL, ExpiryAlertLevel.HIGH],
+            alert_levels=_HIGH_PRIO,
             min_quantity=min_quantity,
-            include_expired=False
+            include_expired=False,
+            limit=None
         )
         
-        return [ExpiryAlertResponse(**alert.__dict__) for alert in alerts]
+        return alerts
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -130,6 +196,31 @@ async def get_expiry_summary(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/batches/mark-expired")
+async def mark_batches_expired(
+    batch_ids: List[int] = Body(..., description="IDs of the batches to mark as expired"),
+    user_id: int = Query(..., description="ID of user marking the batches as expired"),
+    db: AsyncSession = Depends(get_database)
+):
+    """
+    Mark several batches as expired in one transaction (e.g. a nightly sweep).
+    
+    Batches that are missing or already empty are skipped.
+    """
+    service = ExpiryService(db)
+    
+    try:
+        marked = await service.mark_batches_expired(batch_ids, user_id)
+        
+        return {
+            "message": f"{marked} batches marked as expired",
+            "marked": marked
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/batches/{batch_id}/mark-expired")
 async def mark_batch_expired(
     batch_id: int,
@@ -166,6 +257,25 @@ async def mark_batch_expired(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _load_dashboard_alerts(db: AsyncSession):
+    """Load per-level alert counts, critical alerts and top-value alerts."""
+    service = ExpiryService(db)
+    level_counts = await service.get_alert_counts_by_level(min_quantity=1, include_expired=False)
+    critical_alerts = await service.get_expiry_alerts(
+        alert_levels=_CRITICAL_ONLY,
+        min_quantity=1,
+        include_expired=False,
+        limit=10
+    )
+    high_value_alerts = await service.get_top_value_alerts(
+        limit=10,
+        alert_levels=_DASHBOARD_LEVELS,
+        min_quantity=1,
+        include_expired=False
+    )
+    return level_counts, critical_alerts, high_value_alerts
+
+
 @router.get("/dashboard")
 async def get_expiry_dashboard(
     db: AsyncSession = Depends(get_database)
@@ -181,43 +291,35 @@ async def get_expiry_dashboard(
     service = ExpiryService(db)
     
     try:
-        # Get summary
-        summary = await service.get_expiry_summary()
-        
-        # Get top 10 critical alerts
-        critical_alerts = await service.get_expiry_alerts(
-            alert_levels=[ExpiryAlertLevel.CRITICAL],
-            min_quantity=1,
-            include_expired=False
+        # Load the summary and the alert data concurrently; the alert
+        # queries run on their own session
+        summary, (level_counts, critical_alerts, high_value_alerts) = await asyncio.gather(
+            service.get_expiry_summary(),
+            run_in_new_session(_load_dashboard_alerts)
         )
-        top_critical = critical_alerts[:10]
         
-        # Get high-value alerts (top 10 by estimated value)
-        all_alerts = await service.get_expiry_alerts(
-            alert_levels=[ExpiryAlertLevel.CRITICAL, ExpiryAlertLevel.HIGH, ExpiryAlertLevel.MEDIUM],
-            min_quantity=1,
-            include_expired=False
+        alert_counts = {level: count for level, (count, _) in level_counts.items()}
+        total_at_risk_value = sum(
+            level_counts[level][1]
+            for level in _DASHBOARD_LEVELS
         )
-        high_value_alerts = sorted(all_alerts, key=lambda x: x.estimated_value, reverse=True)[:10]
-        
-        # Calculate total at-risk value
-        total_at_risk_value = sum(alert.estimated_value for alert in all_alerts)
         
         # Generate recommendations
         recommendations = []
         
-        if len(critical_alerts) > 0:
+        critical_count = alert_counts[ExpiryAlertLevel.CRITICAL]
+        if critical_count > 0:
             recommendations.append({
                 "type": "urgent",
-                "message": f"{len(critical_alerts)} items expire within 1 week. Immediate action required.",
+                "message": f"{critical_count} items expire within 1 week. Immediate action required.",
                 "action": "Review critical alerts and implement disposal or promotional strategies."
             })
         
-        high_alerts = [a for a in all_alerts if a.alert_level == ExpiryAlertLevel.HIGH]
-        if len(high_alerts) > 5:
+        high_count = alert_counts[ExpiryAlertLevel.HIGH]
+        if high_count > 5:
             recommendations.append({
                 "type": "warning",
-                "message": f"{len(high_alerts)} items expire within 1 month.",
+                "message": f"{high_count} items expire within 1 month.",
                 "action": "Consider promotional pricing or supplier return options."
             })
         
@@ -230,15 +332,15 @@ async def get_expiry_dashboard(
         
         return {
             "summary": summary,
-            "critical_alerts": [ExpiryAlertResponse(**alert.__dict__) for alert in top_critical],
-            "high_value_alerts": [ExpiryAlertResponse(**alert.__dict__) for alert in high_value_alerts],
+            "critical_alerts": _alerts_adapter.validate_python(critical_alerts),
+            "high_value_alerts": _alerts_adapter.validate_python(high_value_alerts),
             "total_at_risk_value": total_at_risk_value,
             "recommendations": recommendations,
             "alert_counts": {
-                "critical": len([a for a in all_alerts if a.alert_level == ExpiryAlertLevel.CRITICAL]),
-                "high": len([a for a in all_alerts if a.alert_level == ExpiryAlertLevel.HIGH]),
-                "medium": len([a for a in all_alerts if a.alert_level == ExpiryAlertLevel.MEDIUM]),
-                "low": len([a for a in all_alerts if a.alert_level == ExpiryAlertLevel.LOW])
+                "critical": alert_counts[ExpiryAlertLevel.CRITICAL],
+                "high": alert_counts[ExpiryAlertLevel.HIGH],
+                "medium": alert_counts[ExpiryAlertLevel.MEDIUM],
+                "low": alert_counts[ExpiryAlertLevel.LOW]
             }
         }
     
@@ -1,12 +1,14 @@
 """Product management API endpoints."""
 
+import asyncio
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
 from pydantic import BaseModel, Field
 from decimal import Decimal
 
-from app.database import get_database
+from app.database import get_database, run_in_new_session
 from app.services.product_service import ProductService
 from app.services.expiry_service import ExpiryService
 
@@ -104,6 +106,31 @@ class CategoryResponse(BaseModel):
         from_attributes = True
 
 
+def _is_unique_violation(error: IntegrityError) -> bool:
+    """Check whether an integrity error is a unique constraint violation."""
+    # asyncpg errors carry the SQLSTATE; SQLite only says so in the message
+    sqlstate = getattr(error.orig, "sqlstate", None)
+    if sqlstate is not None:
+        return sqlstate == "23505"
+    return str(error.orig).lower().startswith("unique constraint failed")
+
+
+def _product_integrity_detail(error: IntegrityError) -> str:
+    """Describe a product integrity error for the client.
+    
+    Only unique violations on the SKU or barcode are reported as
+    duplicates; anything else (e.g. an unknown category) gets a generic
+    message.
+    """
+    if _is_unique_violation(error):
+        message = str(error.orig).lower()
+        if "barcode" in message:
+            return "Barcode already exists"
+        if "sku" in message:
+            return "SKU already exists"
+    return "Product data violates a database constraint"
+
+
 @router.post("/", response_model=ProductResponse)
 async def create_product(
     product: ProductCreate,
@@ -112,20 +139,12 @@ async def create_product(
     """Create a new product."""
     service = ProductService(db)
     
-    # Check if SKU already exists
-    existing = await service.get_product_by_sku(product.sku)
-    if existing:
-        raise HTTPException(status_code=400, detail="SKU already exists")
-    
-    # Check if barcode already exists (if provided)
-    if product.barcode:
-        existing = await service.get_product_by_barcode(product.barcode)
-        if existing:
-            raise HTTPException(status_code=400, detail="Barcode already exists")
-    
+    # SKU and barcode uniqueness is enforced by the database constraints
     try:
         new_product = await service.create_product(product.model_dump())
-        return ProductResponse.model_validate(new_product)
+        return new_product
+    except IntegrityError as e:
+        raise HTTPException(status_code=400, detail=_product_integrity_detail(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -136,6 +155,7 @@ async def get_products(
     active_only: bool = Query(True),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    after_id: Optional[int] = Query(None, description="Return products after this ID (the last ID of the previous page)"),
     db: AsyncSession = Depends(get_database)
 ):
     """Get all products with pagination."""
@@ -144,9 +164,10 @@ async def get_products(
         category_id=category_id,
         active_only=active_only,
         skip=skip,
-        limit=limit
+        limit=limit,
+        after_id=after_id
     )
-    return [ProductResponse.model_validate(p) for p in products]
+    return products
 
 
 @router.get("/search", response_model=List[ProductResponse])
@@ -165,7 +186,7 @@ async def search_products(
         active_only=active_only,
         limit=limit
     )
-    return [ProductResponse.model_validate(p) for p in products]
+    return products
 
 
 @router.get("/{product_id}", response_model=ProductResponse)
@@ -178,7 +199,7 @@ async def get_product(
     product = await service.get_product_by_id(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return ProductResponse.model_validate(product)
+    return product
 
 
 @router.get("/sku/{sku}", response_model=ProductResponse)
@@ -191,7 +212,7 @@ async def get_product_by_sku(
     product = await service.get_product_by_sku(sku)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return ProductResponse.model_validate(product)
+    return product
 
 
 @router.get("/barcode/{barcode}", response_model=ProductResponse)
@@ -204,7 +225,7 @@ async def get_product_by_barcode(
     product = await service.get_product_by_barcode(barcode)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return ProductResponse.model_validate(product)
+    return product
 
 
 @router.put("/{product_id}", response_model=ProductResponse)
@@ -219,11 +240,14 @@ async def update_product(
     # Remove None values from update data
     update_data = {k: v for k, v in product_update.model_dump().items() if v is not None}
     
-    updated_product = await service.update_product(product_id, update_data)
+    try:
+        updated_product = await service.update_product(product_id, update_data)
+    except IntegrityError as e:
+        raise HTTPException(status_code=400, detail=_product_integrity_detail(e))
     if not updated_product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    return ProductResponse.model_validate(updated_product)
+    return updated_product
 
 
 @router.delete("/{product_id}")
@@ -245,18 +269,18 @@ async def get_product_expiry_alerts(
     db: AsyncSession = Depends(get_database)
 ):
     """Get expiry alerts for a specific product."""
-    # Verify product exists
+    # Look up the product and fetch its alerts concurrently; the alerts
+    # query runs on its own session
     product_service = ProductService(db)
-    product = await product_service.get_product_by_id(product_id)
+    product, product_alerts = await asyncio.gather(
+        product_service.get_product_by_id(product_id),
+        run_in_new_session(lambda session: ExpiryService(session).get_alerts_for_product(product_id))
+    )
+    
+    # Verify product exists
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    expiry_service = ExpiryService(db)
-    alerts = await expiry_service.get_expiry_alerts()
-    
-    # Filter alerts for this product
-    product_alerts = [alert for alert in alerts if alert.product_id == product_id]
-    
     return {
         "product_id": product_id,
         "product_name": product.name,
@@ -274,7 +298,7 @@ async def create_category(
     service = ProductService(db)
     try:
         new_category = await service.create_category(category.model_dump())
-        return CategoryResponse.model_validate(new_category)
+        return new_category
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -287,7 +311,7 @@ async def get_categories(
     """Get all product categories."""
     service = ProductService(db)
     categories = await service.get_all_categories(active_only=active_only)
-    return [CategoryResponse.model_validate(c) for c in categories]
+    return categories
 
 
 @router.get("/categories/{category_id}", response_model=CategoryResponse)
@@ -300,4 +324,4 @@ async def get_category(
     category = await service.get_category_by_id(category_id)
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
-    return CategoryResponse.model_validate(category)
+    return category
@@ -0,0 +1,130 @@
+"""Lightweight in-process caching helpers."""
+
+import asyncio
+import functools
+import inspect
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+def _freeze(value: Any) -> Hashable:
+    """Convert list/set/dict arguments into hashable equivalents."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+class AsyncTTLCache:
+    """Async cache that keeps computed values for a fixed number of seconds.
+
+    Concurrent misses for the same key are coalesced so the value is only
+    computed once. ``clear()`` bumps a version counter, so values computed
+    before an invalidation are never stored.
+
+    If ``scope`` is given, its result is added to every key built by
+    ``cached``, e.g. ``date.today`` so entries never outlive the day they
+    were computed for.
+
+    Expired entries are dropped whenever a value is stored. At most
+    ``maxsize`` entries are kept; beyond that the oldest is dropped even
+    if it has not expired.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        scope: Optional[Callable[[], Hashable]] = None,
+        maxsize: int = 1024
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.scope = scope
+        self.maxsize = maxsize
+        # Oldest first; every entry lives for ttl_seconds, so expired ones are at the front
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._version = 0
+
+    def clear(self) -> None:
+        """Invalidate all cached values."""
+        self._version += 1
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _purge_expired(self, now: float) -> None:
+        while self._data:
+            expires_at, _ = next(iter(self._data.values()))
+            if expires_at > now:
+                break
+            self._data.popitem(last=False)
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        now = time.monotonic()
+        self._purge_expired(now)
+
+        self._data.pop(key, None)
+        self._data[key] = (now + self.ttl_seconds, value)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def _get_fresh(self, key: Hashable) -> Tuple[bool, Any]:
+        entry = self._data.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return True, entry[1]
+        return False, None
+
+    async def get_or_set(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value for ``key`` or compute it with ``factory``."""
+        if self.ttl_seconds <= 0:
+            return await factory()
+
+        hit, value = self._get_fresh(key)
+        if hit:
+            return value
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                # Another coroutine may have filled the entry while we waited
+                hit, value = self._get_fresh(key)
+                if hit:
+                    return value
+
+                version = self._version
+                value = await factory()
+                if version == self._version:
+                    self._store(key, value)
+                return value
+        finally:
+            if self._locks.get(key) is lock:
+                del self._locks[key]
+
+    def cached(self, func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        """Decorate an async method so its results are cached by arguments.
+
+        The key is built from the method name and its bound arguments
+        (excluding ``self``), with defaults applied so positional and
+        keyword calls share entries. Cached values are shared between
+        callers and must be treated as read-only.
+        """
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            scope = self.scope() if self.scope is not None else None
+            key = (func.__qualname__, scope) + tuple(
+                (name, _freeze(value))
+                for name, value in bound.arguments.items()
+                if name != "self"
+            )
+            return await self.get_or_set(key, lambda: func(*args, **kwargs))
+
+        return wrapper
@@ -10,12 +10,20 @@ class Settings(BaseSettings):
     
     # Database
     database_url: str = "sqlite:///./pathway.db"
+    # Connection pool sizing; ignored for SQLite, which keeps its driver's default pool
+    database_pool_size: int = 20
+    database_max_overflow: int = 10
+    database_pool_recycle_seconds: int = 1800
     
     # Security
     secret_key: str = "your-secret-key-change-this-in-production"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
     
+    # bcrypt cost for users created by scripts/init_sample_data.py; lower it
+    # (minimum 4) only for throwaway development databases
+    sample_data_bcrypt_rounds: int = 12
+    
     # Application
     app_name: str = "Pathway Pharmacy POS"
     app_version: str = "1.0.0"
@@ -38,6 +46,19 @@ class Settings(BaseSettings):
     expiry_alert_1_month: int = 30
     expiry_alert_1_week: int = 7
     
+    # How long expiry summaries/alerts are cached in-process (0 disables)
+    expiry_cache_ttl_seconds: int = 30
+    
+    # How long stock levels/inventory summaries are cached in-process (0 disables)
+    inventory_cache_ttl_seconds: int = 10
+    
+    # How long product details used by the cart are cached in-process (0 disables)
+    product_cache_ttl_seconds: int = 300
+    
+    # POS carts untouched for this long are discarded, oldest first beyond max_carts
+    cart_ttl_seconds: int = 3600
+    max_carts: int = 10000
+    
     # Email Settings
     smtp_server: Optional[str] = None
     smtp_port: int = 587
@@ -1,10 +1,18 @@
-"""Database configuration and connection management."""
+"""Database configuration and connection management.
+
+There is no migration framework. ``create_tables`` only creates missing
+tables (with their indexes); changes to tables that already exist, such
+as new or retired indexes, are made by the scripts under ``scripts/``.
+"""
 
 import asyncio
-from typing import AsyncGenerator
+import enum
+from datetime import datetime, timezone
+from typing import AsyncGenerator, Awaitable, Callable, Dict, Iterator, Tuple, Type, TypeVar
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import MetaData
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+from sqlalchemy import CheckConstraint, Column, MetaData, Table, event, text
 
 from app.config import get_settings
 
@@ -14,6 +22,25 @@ class Base(DeclarativeBase):
     metadata = MetaData()
 
 
+def utcnow() -> datetime:
+    """Get the current time as a timezone-aware UTC datetime."""
+    return datetime.now(timezone.utc)
+
+
+def enum_check(column: str, enum_cls: Type[enum.Enum]) -> CheckConstraint:
+    """CHECK constraint limiting a string column to the values of ``enum_cls``.
+    
+    Enum-valued columns are stored as plain strings so reads skip the
+    ORM's per-value enum conversion; ``str`` enums still compare equal
+    to the raw values.
+    """
+    values = ", ".join(f"'{member.value}'" for member in enum_cls)
+    return CheckConstraint(
+        f"{column} IN ({values})",
+        info={"column": column, "enum": enum_cls}
+    )
+
+
 # Database engine and session
 settings = get_settings()
 
@@ -24,12 +51,59 @@ if database_url.startswith("sqlite:///"):
 elif database_url.startswith("postgresql://"):
     database_url = database_url.replace("postgresql://", "postgresql+asyncpg://")
 
+# SQLite connections may be handed between threads by the async driver
+connect_args = {"check_same_thread": False} if database_url.startswith("sqlite") else {}
+
+if database_url.endswith(":memory:"):
+    # An in-memory SQLite database lives only as long as its connection, so
+    # all sessions share a single one (used by the test suite)
+    pool_args = {"poolclass": StaticPool}
+elif database_url.startswith("sqlite"):
+    # aiosqlite defaults to NullPool, which would reopen the file and rerun
+    # the PRAGMAs below for every session and throw away each connection's
+    # page cache and memory map; keep connections open instead
+    pool_args = {
+        "poolclass": AsyncAdaptedQueuePool,
+        "pool_size": settings.database_pool_size,
+        "max_overflow": settings.database_max_overflow,
+    }
+else:
+    pool_args = {
+        "pool_size": settings.database_pool_size,
+        "max_overflow": settings.database_max_overflow,
+        "pool_pre_ping": True,
+        "pool_recycle": settings.database_pool_recycle_seconds,
+    }
+
 engine = create_async_engine(
     database_url,
     echo=settings.debug,
-    future=True
+    future=True,
+    connect_args=connect_args,
+    **pool_args
 )
 
+# Per-connection SQLite tuning. WAL lets readers run alongside a writer;
+# it needs the database file on a local disk (not a network share).
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA busy_timeout=5000",
+)
+
+if database_url.startswith("sqlite"):
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in SQLITE_PRAGMAS:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
 AsyncSessionLocal = async_sessionmaker(
     engine,
     class_=AsyncSession,
@@ -46,13 +120,77 @@ async def get_database() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+T = TypeVar("T")
+
+
+async def run_in_new_session(func: Callable[[AsyncSession], Awaitable[T]]) -> T:
+    """Run ``func`` on its own database session.
+    
+    An AsyncSession does not allow concurrent operations, so every query
+    that is awaited alongside others (e.g. with ``asyncio.gather``) needs a
+    dedicated session.
+    """
+    async with AsyncSessionLocal() as session:
+        return await func(session)
+
+
 async def create_tables():
     """Create all database tables."""
     # Import all models to ensure they're registered
     from app.models import user, product, inventory, customer, sale
     
     async with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            # Trigram operator classes used by the product search indexes
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_check_enum_columns)
+
+
+def enum_columns() -> Iterator[Tuple[Table, Column, Type[enum.Enum]]]:
+    """Yield each enum-valued column with its table and enum class."""
+    for table in Base.metadata.sorted_tables:
+        for constraint in table.constraints:
+            enum_cls = constraint.info.get("enum")
+            if enum_cls is not None:
+                yield table, table.c[constraint.info["column"]], enum_cls
+
+
+def native_enum_columns(connection) -> Dict[Tuple[str, str], str]:
+    """Find enum columns that still use a native PostgreSQL ENUM type.
+    
+    Returns the type name keyed by ``(table, column)``. Databases created
+    before these columns became strings keep the old types, since
+    ``create_all`` never alters existing tables.
+    """
+    if connection.dialect.name != "postgresql":
+        return {}
+    
+    wanted = {(table.name, column.name) for table, column, _ in enum_columns()}
+    result = connection.execute(text(
+        "SELECT table_name, column_name, udt_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND data_type = 'USER-DEFINED'"
+    ))
+    return {
+        (table_name, column_name): udt_name
+        for table_name, column_name, udt_name in result
+        if (table_name, column_name) in wanted
+    }
+
+
+def _check_enum_columns(connection):
+    """Refuse to start on a PostgreSQL database with native ENUM columns.
+    
+    Their labels are the old member names (``ADMIN``), so writing the
+    string values the models now use would fail.
+    """
+    native = native_enum_columns(connection)
+    if native:
+        columns = ", ".join(f"{table}.{column}" for table, column in sorted(native))
+        raise RuntimeError(
+            f"Columns {columns} still use native ENUM types; "
+            "run scripts/migrate_enum_columns.py once to convert them"
+        )
 
 
 async def drop_tables():
@@ -3,11 +3,13 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse
 from contextlib import asynccontextmanager
+from sqlalchemy import text
 
 from app.config import get_settings
-from app.database import create_tables, get_database
+from app.database import create_tables, AsyncSessionLocal
+from app.api import products, expiry
 
 
 @asynccontextmanager
@@ -26,7 +28,8 @@ app = FastAPI(
     title=settings.app_name,
     version=settings.app_version,
     description="A comprehensive Point of Sale system for pharmacies with intelligent expiry management",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -63,8 +66,8 @@ async def health_check():
     """Health check endpoint."""
     try:
         # Test database connection
-        db = await get_database()
-        await db.execute("SELECT 1")
+        async with AsyncSessionLocal() as session:
+            await session.execute(text("SELECT 1"))
         db_status = "healthy"
     except Exception as e:
         db_status = f"unhealthy: {str(e)}"
@@ -77,7 +80,6 @@ async def health_check():
 
 
 # Include API routers
-from app.api import products, expiry
 app.include_router(products.router, prefix="/api/products", tags=["products"])
 app.include_router(expiry.router, prefix="/api/expiry", tags=["expiry"])
 
@@ -1,11 +1,16 @@
 """Database models for Pathway Pharmacy POS System."""
 
+from sqlalchemy.orm import configure_mappers
+
 from app.models.user import User
 from app.models.product import Product, ProductCategory
 from app.models.inventory import InventoryBatch, StockMovement
 from app.models.customer import Customer
 from app.models.sale import Sale, SaleItem
 
+# Resolve relationships now rather than on the first query
+configure_mappers()
+
 __all__ = [
     "User",
     "Product", 
@@ -3,16 +3,48 @@
 from datetime import datetime, date
 from typing import Optional, List
 from decimal import Decimal
-from sqlalchemy import String, Text, Numeric, Boolean, DateTime, Date, Integer
+from sqlalchemy import String, Text, Numeric, Boolean, DateTime, Date, Integer, Index, func
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.sql.functions import FunctionElement
 
 from app.database import Base
 
 
+class age_in_years(FunctionElement):
+    """SQL expression for the number of whole years since a date."""
+    type = Integer()
+    name = "age_in_years"
+    inherit_cache = True
+
+
+@compiles(age_in_years)
+def _compile_age_in_years(element, compiler, **kw):
+    born = compiler.process(element.clauses, **kw)
+    return f"CAST(date_part('year', age({born})) AS INTEGER)"
+
+
+@compiles(age_in_years, "sqlite")
+def _compile_age_in_years_sqlite(element, compiler, **kw):
+    born = compiler.process(element.clauses, **kw)
+    return (
+        f"(CAST(strftime('%Y', 'now', 'localtime') AS INTEGER) - CAST(strftime('%Y', {born}) AS INTEGER)"
+        f" - (strftime('%m-%d', 'now', 'localtime') < strftime('%m-%d', {born})))"
+    )
+
+
 class Customer(Base):
     """Customer model for pharmacy customers."""
     
     __tablename__ = "customers"
+    __table_args__ = (
+        # Name-sorted customer listings
+        Index("ix_customer_name", "last_name", "first_name"),
+    )
+    
+    # Fetch server-generated timestamps back on INSERT/UPDATE
+    __mapper_args__ = {"eager_defaults": True}
     
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     
@@ -57,20 +89,21 @@ class Customer(Base):
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     notes: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     
-    # Timestamps
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
-    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    last_visit: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    # Timestamps (filled in by the database; tables created before this
+    # need scripts/migrate_customer_timestamps.py)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    last_visit: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
     
-    # Relationships
-    sales: Mapped[List["Sale"]] = relationship("Sale", back_populates="customer")
+    # Relationships (load sales explicitly, e.g. with selectinload)
+    sales: Mapped[List["Sale"]] = relationship("Sale", back_populates="customer", lazy="raise")
     
     @property
     def full_name(self) -> str:
         """Get customer's full name."""
         return f"{self.first_name} {self.last_name}"
     
-    @property
+    @hybrid_property
     def age(self) -> Optional[int]:
         """Calculate customer's age from date of birth."""
         if self.date_of_birth:
@@ -80,5 +113,15 @@ class Customer(Base):
             )
         return None
     
+    @age.inplace.expression
+    @classmethod
+    def _age_expression(cls):
+        """Compute age in SQL so it can be used in WHERE/ORDER BY clauses."""
+        return age_in_years(cls.date_of_birth)
+    
     def __repr__(self) -> str:
         return f"<Customer(id={self.id}, name='{self.full_name}', email='{self.email}')>"
+
+
+# Case-insensitive email lookups (WHERE lower(email) = lower(:email))
+Index("ix_customer_email_lower", func.lower(Customer.email))
@@ -3,11 +3,32 @@
 from datetime import datetime, date
 from typing import Optional, List
 from decimal import Decimal
-from sqlalchemy import String, Numeric, Boolean, DateTime, Date, ForeignKey, Integer, Enum, Text
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import String, Numeric, Boolean, DateTime, Date, ForeignKey, Integer, Text, Index, text, func
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Mapped, mapped_column, relationship, validates
+from sqlalchemy.sql.functions import FunctionElement
 import enum
 
-from app.database import Base
+from app.database import Base, enum_check, utcnow
+
+
+class days_between(FunctionElement):
+    """SQL expression for the number of days from one date to another."""
+    type = Integer()
+    name = "days_between"
+    inherit_cache = True
+
+
+@compiles(days_between)
+def _compile_days_between(element, compiler, **kw):
+    start, end = (compiler.process(clause, **kw) for clause in element.clauses)
+    return f"({end} - {start})"
+
+
+@compiles(days_between, "sqlite")
+def _compile_days_between_sqlite(element, compiler, **kw):
+    start, end = (compiler.process(clause, **kw) for clause in element.clauses)
+    return f"CAST(julianday({end}) - julianday({start}) AS INTEGER)"
 
 
 class MovementType(str, enum.Enum):
@@ -25,6 +46,21 @@ class InventoryBatch(Base):
     """Inventory batch model for tracking products with expiry dates."""
     
     __tablename__ = "inventory_batches"
+    __table_args__ = (
+        # Expiry service scans over live stock only; INCLUDE makes it covering
+        # for the alert queries on PostgreSQL
+        Index(
+            "ix_batches_live_expiry", "expiry_date",
+            postgresql_include=["current_quantity", "selling_price_per_unit", "product_id", "batch_number"],
+            postgresql_where=text("is_active AND current_quantity > 0"),
+            sqlite_where=text("is_active = 1 AND current_quantity > 0")
+        ),
+        # Per-product stock lookups and FIFO reservation (ORDER BY expiry_date)
+        Index(
+            "ix_batch_avail", "product_id", "is_active", "expiry_date",
+            postgresql_include=["current_quantity", "reserved_quantity", "selling_price_per_unit"]
+        ),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     batch_number: Mapped[str] = mapped_column(String(50), index=True)
@@ -58,12 +94,12 @@ class InventoryBatch(Base):
     product_id: Mapped[int] = mapped_column(ForeignKey("products.id"))
     
     # Timestamps
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
-    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, server_default=func.now(), onupdate=utcnow)
     
     # Relationships
     product: Mapped["Product"] = relationship("Product", back_populates="inventory_batches")
-    stock_movements: Mapped[List["StockMovement"]] = relationship("StockMovement", back_populates="batch")
+    stock_movements: Mapped[List["StockMovement"]] = relationship("StockMovement", back_populates="batch", lazy="raise")
     
     @property
     def available_quantity(self) -> int:
@@ -83,9 +119,10 @@ class StockMovement(Base):
     """Stock movement tracking for audit trail."""
     
     __tablename__ = "stock_movements"
+    __table_args__ = (enum_check("movement_type", MovementType),)
     
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
-    movement_type: Mapped[MovementType] = mapped_column(Enum(MovementType))
+    movement_type: Mapped[str] = mapped_column(String(20))
     quantity: Mapped[int] = mapped_column(Integer)  # Positive for in, negative for out
     unit_cost: Mapped[Optional[Decimal]] = mapped_column(Numeric(10, 2), nullable=True)
     
@@ -99,12 +136,20 @@ class StockMovement(Base):
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     
     # Timestamps
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, server_default=func.now())
     
     # Relationships
     product: Mapped["Product"] = relationship("Product")
     batch: Mapped[Optional["InventoryBatch"]] = relationship("InventoryBatch", back_populates="stock_movements")
     user: Mapped["User"] = relationship("User")
     
+    @validates("movement_type")
+    def _validate_movement_type(self, key, value):
+        return MovementType(value)
+    
     def __repr__(self) -> str:
         return f"<StockMovement(id={self.id}, type='{self.movement_type}', qty={self.quantity})>"
+
+
+# Newest-first movement history per product (ORDER BY created_at DESC LIMIT n)
+Index("ix_stock_movements_product_created", StockMovement.product_id, StockMovement.created_at.desc())
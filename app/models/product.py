@@ -3,10 +3,10 @@
 from datetime import datetime
 from typing import Optional, List
 from decimal import Decimal
-from sqlalchemy import String, Text, Numeric, Boolean, DateTime, ForeignKey, Integer
+from sqlalchemy import String, Text, Numeric, Boolean, DateTime, ForeignKey, Integer, Index, literal_column, text, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
-from app.database import Base
+from app.database import Base, utcnow
 
 
 class ProductCategory(Base):
@@ -20,11 +20,11 @@ class ProductCategory(Base):
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     
     # Timestamps
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
-    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, server_default=func.now(), onupdate=utcnow)
     
-    # Relationships
-    products: Mapped[List["Product"]] = relationship("Product", back_populates="category")
+    # Relationships (load products explicitly, e.g. with selectinload)
+    products: Mapped[List["Product"]] = relationship("Product", back_populates="category", lazy="raise")
     
     def __repr__(self) -> str:
         return f"<ProductCategory(id={self.id}, name='{self.name}')>"
@@ -34,6 +34,27 @@ class Product(Base):
     """Product model for pharmacy items."""
     
     __tablename__ = "products"
+    __table_args__ = (
+        # Category listings of active products. SQLite index entries end in
+        # the rowid (id), so this also serves keyset pages within a category.
+        Index(
+            "ix_products_active_category", "category_id",
+            postgresql_where=text("is_active"),
+            sqlite_where=text("is_active = 1")
+        ),
+        # Keyset pages over all active products (WHERE is_active AND id > :after
+        # ORDER BY id). SQLite walks the rowid table directly for this.
+        Index(
+            "ix_products_active_id", "id",
+            postgresql_where=text("is_active")
+        ).ddl_if(dialect="postgresql"),
+        # SKU prefix matches (LIKE 'IBU%'); under non-C collations the
+        # unique index on sku only serves equality
+        Index(
+            "ix_products_sku_pattern", "sku",
+            postgresql_ops={"sku": "text_pattern_ops"}
+        ).ddl_if(dialect="postgresql"),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(200), index=True)
@@ -74,13 +95,51 @@ class Product(Base):
     category_id: Mapped[Optional[int]] = mapped_column(ForeignKey("product_categories.id"), nullable=True)
     
     # Timestamps
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
-    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, server_default=func.now(), onupdate=utcnow)
     
-    # Relationships
+    # Relationships (load collections explicitly, e.g. with selectinload)
     category: Mapped[Optional["ProductCategory"]] = relationship("ProductCategory", back_populates="products")
-    inventory_batches: Mapped[List["InventoryBatch"]] = relationship("InventoryBatch", back_populates="product")
-    sale_items: Mapped[List["SaleItem"]] = relationship("SaleItem", back_populates="product")
+    inventory_batches: Mapped[List["InventoryBatch"]] = relationship("InventoryBatch", back_populates="product", lazy="raise")
+    sale_items: Mapped[List["SaleItem"]] = relationship("SaleItem", back_populates="product", lazy="raise")
     
     def __repr__(self) -> str:
         return f"<Product(id={self.id}, name='{self.name}', sku='{self.sku}')>"
+
+
+# Lower-cased text matched by search_products. Literals are inlined rather
+# than bound so queries repeat the indexed expression exactly. Fields are
+# joined with the ASCII unit separator, which users cannot type, so a
+# search such as "tablets ibu" never matches across two fields.
+_space = literal_column("' '")
+_separator = literal_column("'\x1f'")
+product_search_text = func.lower(
+    Product.name + _separator
+    + func.coalesce(Product.generic_name, literal_column("''")) + _separator
+    + func.coalesce(Product.brand_name, literal_column("''")) + _separator
+    + Product.sku
+)
+
+# Substring search (LIKE '%q%') on PostgreSQL; needs the pg_trgm extension.
+# SQLite has no equivalent and scans for leading-wildcard patterns anyway.
+Index(
+    "ix_products_search_fields_trgm",
+    product_search_text.label("search_text"),
+    postgresql_using="gin",
+    postgresql_ops={"search_text": "gin_trgm_ops"}
+).ddl_if(dialect="postgresql")
+
+# Full-text document for multi-word searches on PostgreSQL
+product_search_document = func.to_tsvector(
+    text("'english'"),
+    Product.name + _space
+    + func.coalesce(Product.generic_name, literal_column("''")) + _space
+    + func.coalesce(Product.brand_name, literal_column("''")) + _space
+    + Product.sku
+)
+
+Index(
+    "ix_products_search_document_tsv",
+    product_search_document,
+    postgresql_using="gin"
+).ddl_if(dialect="postgresql")
@@ -3,11 +3,11 @@
 from datetime import datetime
 from typing import Optional, List
 from decimal import Decimal
-from sqlalchemy import String, Text, Numeric, Boolean, DateTime, ForeignKey, Integer, Enum
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import String, Text, Numeric, Boolean, DateTime, ForeignKey, Integer, func
+from sqlalchemy.orm import Mapped, mapped_column, relationship, validates
 import enum
 
-from app.database import Base
+from app.database import Base, enum_check, utcnow
 
 
 class PaymentMethod(str, enum.Enum):
@@ -34,6 +34,10 @@ class Sale(Base):
     """Sales transaction model."""
     
     __tablename__ = "sales"
+    __table_args__ = (
+        enum_check("payment_method", PaymentMethod),
+        enum_check("status", SaleStatus),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     sale_number: Mapped[str] = mapped_column(String(50), unique=True, index=True)
@@ -45,7 +49,7 @@ class Sale(Base):
     total_amount: Mapped[Decimal] = mapped_column(Numeric(10, 2))
     
     # Payment information
-    payment_method: Mapped[PaymentMethod] = mapped_column(Enum(PaymentMethod))
+    payment_method: Mapped[str] = mapped_column(String(20))
     payment_reference: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
     amount_paid: Mapped[Decimal] = mapped_column(Numeric(10, 2))
     change_given: Mapped[Decimal] = mapped_column(Numeric(10, 2), default=0)
@@ -56,7 +60,7 @@ class Sale(Base):
     insurance_coverage: Mapped[Optional[Decimal]] = mapped_column(Numeric(10, 2), nullable=True)
     
     # Status and metadata
-    status: Mapped[SaleStatus] = mapped_column(Enum(SaleStatus), default=SaleStatus.PENDING)
+    status: Mapped[str] = mapped_column(String(20), default=SaleStatus.PENDING)
     notes: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     receipt_printed: Mapped[bool] = mapped_column(Boolean, default=False)
     
@@ -65,13 +69,21 @@ class Sale(Base):
     cashier_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     
     # Timestamps
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
-    completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, server_default=func.now())
+    completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
     
     # Relationships
     customer: Mapped[Optional["Customer"]] = relationship("Customer", back_populates="sales")
     cashier: Mapped["User"] = relationship("User")
-    sale_items: Mapped[List["SaleItem"]] = relationship("SaleItem", back_populates="sale", cascade="all, delete-orphan")
+    sale_items: Mapped[List["SaleItem"]] = relationship("SaleItem", back_populates="sale", cascade="all, delete-orphan", lazy="raise")
+    
+    @validates("payment_method")
+    def _validate_payment_method(self, key, value):
+        return PaymentMethod(value)
+    
+    @validates("status")
+    def _validate_status(self, key, value):
+        return SaleStatus(value)
     
     def __repr__(self) -> str:
         return f"<Sale(id={self.id}, number='{self.sale_number}', total={self.total_amount})>"
@@ -106,7 +118,7 @@ class SaleItem(Base):
     inventory_batch_id: Mapped[Optional[int]] = mapped_column(ForeignKey("inventory_batches.id"), nullable=True)
     
     # Timestamps
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, server_default=func.now())
     
     # Relationships
     sale: Mapped["Sale"] = relationship("Sale", back_populates="sale_items")
@@ -1,16 +1,30 @@
 """Intelligent expiry management and alert service for pharmacy products."""
 
 from datetime import datetime, date, timedelta
-from typing import List, Dict, Optional, Tuple
+from typing import AsyncIterator, List, Dict, Optional, Sequence, Tuple
 from dataclasses import dataclass
 from enum import Enum
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, func
-from sqlalchemy.orm import selectinload
+from sqlalchemy import Date, Float, Numeric, select, insert, update, and_, or_, func, case, cast, desc, literal
+from sqlalchemy.sql import Select
 
 from app.models.product import Product
-from app.models.inventory import InventoryBatch
+from app.models.inventory import InventoryBatch, StockMovement, MovementType, days_between
 from app.config import get_settings
+from app.cache import AsyncTTLCache
+from app.services.inventory_service import inventory_cache
+
+
+# Expiry data changes over hours/days, so summaries and alerts are cached
+# briefly in-process and invalidated whenever a batch is marked expired.
+# Entries are scoped to the current date since every level depends on it.
+expiry_cache = AsyncTTLCache(get_settings().expiry_cache_ttl_seconds, scope=date.today)
+
+
+def _rounded_float(expression, places: int):
+    """Round a SQL expression to ``places`` decimals, returned as a double."""
+    # Rounded as NUMERIC, since PostgreSQL has no round(double, int)
+    return cast(func.round(cast(expression, Numeric), places), Float)
 
 
 class ExpiryAlertLevel(str, Enum):
@@ -22,9 +36,37 @@ class ExpiryAlertLevel(str, Enum):
     INFO = "info"           # More than 6 months
 
 
-@dataclass
+# Quantity above which critical/high alerts call for bulk handling
+_BULK_QUANTITY = {
+    ExpiryAlertLevel.CRITICAL: 50,
+    ExpiryAlertLevel.HIGH: 100,
+}
+
+# Recommended action per (alert level, above bulk quantity)
+_RECOMMENDED_ACTIONS = {
+    (ExpiryAlertLevel.CRITICAL, True): "URGENT: Consider bulk discount sale or return to supplier",
+    (ExpiryAlertLevel.CRITICAL, False): "URGENT: Prioritize sale or mark for disposal",
+    (ExpiryAlertLevel.HIGH, True): "Implement promotional pricing or contact supplier for return",
+    (ExpiryAlertLevel.HIGH, False): "Prioritize in sales recommendations",
+    (ExpiryAlertLevel.MEDIUM, False): "Monitor closely and consider promotional strategies",
+    (ExpiryAlertLevel.LOW, False): "Plan inventory rotation and adjust reorder quantities",
+    (ExpiryAlertLevel.INFO, False): "Monitor for future planning",
+}
+
+
+@dataclass(frozen=True)
 class ExpiryAlert:
-    """Expiry alert data structure."""
+    """Expiry alert data structure.
+    
+    Immutable since cached alert lists are shared between callers.
+    """
+    # Declared by hand rather than with slots=True to keep Python 3.8 support
+    __slots__ = (
+        'batch_id', 'product_id', 'product_name', 'batch_number', 'current_quantity',
+        'expiry_date', 'days_until_expiry', 'alert_level', 'estimated_value',
+        'recommended_action', 'priority_score'
+    )
+    
     batch_id: int
     product_id: int
     product_name: str
@@ -43,41 +85,30 @@ class ExpiryService:
     
     def __init__(self, db: AsyncSession):
         self.db = db
-        self.settings = get_settings()
-    
-    def _calculate_alert_level(self, days_until_expiry: int) -> ExpiryAlertLevel:
-        """Calculate alert level based on days until expiry."""
-        if days_until_expiry <= self.settings.expiry_alert_1_week:
-            return ExpiryAlertLevel.CRITICAL
-        elif days_until_expiry <= self.settings.expiry_alert_1_month:
-            return ExpiryAlertLevel.HIGH
-        elif days_until_expiry <= self.settings.expiry_alert_3_months:
-            return ExpiryAlertLevel.MEDIUM
-        elif days_until_expiry <= self.settings.expiry_alert_6_months:
-            return ExpiryAlertLevel.LOW
-        else:
-            return ExpiryAlertLevel.INFO
+        
+        # Upper day threshold for each bounded alert level, in order; read
+        # from settings once instead of on every query build
+        settings = get_settings()
+        self._level_thresholds: Tuple[Tuple[ExpiryAlertLevel, int], ...] = (
+            (ExpiryAlertLevel.CRITICAL, settings.expiry_alert_1_week),
+            (ExpiryAlertLevel.HIGH, settings.expiry_alert_1_month),
+            (ExpiryAlertLevel.MEDIUM, settings.expiry_alert_3_months),
+            (ExpiryAlertLevel.LOW, settings.expiry_alert_6_months),
+        )
     
-    def _calculate_priority_score(
-        self, 
-        days_until_expiry: int, 
-        quantity: int, 
-        unit_value: float,
-        is_controlled: bool = False
-    ) -> float:
-        """Calculate priority score for expiry alerts (higher = more urgent)."""
+    def _priority_score_expression(self, days_until_expiry, quantity, total_value, is_controlled):
+        """Build the SQL expression for the alert priority score (higher = more urgent)."""
         # Base urgency score (inverse of days)
-        urgency_score = max(0, 365 - days_until_expiry) / 365
+        urgency_score = case((days_until_expiry < 365, (365 - days_until_expiry) / 365.0), else_=0.0)
         
-        # Value impact score
-        total_value = quantity * unit_value
-        value_score = min(total_value / 1000, 1.0)  # Normalize to max 1.0
+        # Value impact score (normalized to max 1.0)
+        value_score = case((total_value < 1000, total_value / 1000.0), else_=1.0)
         
-        # Quantity impact score
-        quantity_score = min(quantity / 100, 1.0)  # Normalize to max 1.0
+        # Quantity impact score (normalized to max 1.0)
+        quantity_score = case((quantity < 100, quantity / 100.0), else_=1.0)
         
         # Controlled substance multiplier
-        controlled_multiplier = 1.5 if is_controlled else 1.0
+        controlled_multiplier = case((is_controlled == True, 1.5), else_=1.0)
         
         # Weighted combination
         priority_score = (
@@ -86,7 +117,7 @@ class ExpiryService:
             quantity_score * 0.2
         ) * controlled_multiplier
         
-        return round(priority_score, 3)
+        return _rounded_float(priority_score, 3)
     
     def _get_recommended_action(
         self, 
@@ -95,205 +126,326 @@ class ExpiryService:
         alert_level: ExpiryAlertLevel
     ) -> str:
         """Get recommended action based on expiry timeline and quantity."""
-        if alert_level == ExpiryAlertLevel.CRITICAL:
-            if quantity > 50:
-                return "URGENT: Consider bulk discount sale or return to supplier"
-            else:
-                return "URGENT: Prioritize sale or mark for disposal"
-        elif alert_level == ExpiryAlertLevel.HIGH:
-            if quantity > 100:
-                return "Implement promotional pricing or contact supplier for return"
-            else:
-                return "Prioritize in sales recommendations"
-        elif alert_level == ExpiryAlertLevel.MEDIUM:
-            return "Monitor closely and consider promotional strategies"
-        elif alert_level == ExpiryAlertLevel.LOW:
-            return "Plan inventory rotation and adjust reorder quantities"
-        else:
-            return "Monitor for future planning"
+        bulk_quantity = _BULK_QUANTITY.get(alert_level)
+        is_bulk = bulk_quantity is not None and quantity > bulk_quantity
+        return _RECOMMENDED_ACTIONS[alert_level, is_bulk]
+    
+    def _alert_level_condition(self, alert_level: ExpiryAlertLevel, today: date):
+        """Build the SQL condition matching batches at the given alert level."""
+        lower_days = None
+        for level, max_days in self._level_thresholds:
+            if level == alert_level:
+                upper = InventoryBatch.expiry_date <= today + timedelta(days=max_days)
+                if lower_days is None:
+                    return upper
+                return and_(InventoryBatch.expiry_date > today + timedelta(days=lower_days), upper)
+            lower_days = max_days
+        return InventoryBatch.expiry_date > today + timedelta(days=lower_days)
+    
+    def _alert_level_expression(self, today: date):
+        """Build a SQL CASE expression evaluating to each batch's alert level."""
+        return case(
+            *[
+                (InventoryBatch.expiry_date <= today + timedelta(days=max_days), level.value)
+                for level, max_days in self._level_thresholds
+            ],
+            else_=ExpiryAlertLevel.INFO.value
+        )
+    
+    def _filter_alerts(
+        self,
+        query: Select,
+        today: date,
+        alert_levels: Optional[Sequence[ExpiryAlertLevel]],
+        min_quantity: int,
+        include_expired: bool,
+        product_id: Optional[int] = None
+    ) -> Select:
+        """Apply the filters shared by the alert queries."""
+        # Bare boolean columns compile to "is_active = 1" on SQLite, which
+        # the partial indexes' WHERE clauses match (IS 1 would not)
+        query = query.where(
+            InventoryBatch.is_active,
+            InventoryBatch.current_quantity >= min_quantity,
+            Product.is_active
+        )
+        
+        if not include_expired:
+            query = query.where(InventoryBatch.expiry_date >= today)
+        
+        if alert_levels:
+            query = query.where(or_(*[
+                self._alert_level_condition(level, today) for level in dict.fromkeys(alert_levels)
+            ]))
+        
+        if product_id is not None:
+            query = query.where(InventoryBatch.product_id == product_id)
+        
+        return query
+    
+    def _alert_score_expression(self, today: date):
+        """Build the priority score expression for the batches in an alert query."""
+        return self._priority_score_expression(
+            days_between(literal(today, Date), InventoryBatch.expiry_date),
+            InventoryBatch.current_quantity,
+            InventoryBatch.current_quantity * InventoryBatch.selling_price_per_unit,
+            Product.is_controlled_substance
+        )
+    
+    def _alert_columns(self, today: date) -> list:
+        """Build the labelled SQL columns an expiry alert is read from."""
+        return [
+            InventoryBatch.id.label('batch_id'),
+            Product.id.label('product_id'),
+            Product.name.label('product_name'),
+            InventoryBatch.batch_number,
+            InventoryBatch.current_quantity,
+            InventoryBatch.expiry_date,
+            days_between(literal(today, Date), InventoryBatch.expiry_date).label('days_until_expiry'),
+            self._alert_level_expression(today).label('alert_level'),
+            _rounded_float(InventoryBatch.current_quantity * InventoryBatch.selling_price_per_unit, 2).label('estimated_value'),
+            self._alert_score_expression(today).label('priority_score')
+        ]
     
+    def _alert_from_row(self, row) -> ExpiryAlert:
+        """Build an expiry alert from a row selected with ``_alert_columns``."""
+        alert_level = ExpiryAlertLevel(row.alert_level)
+        
+        return ExpiryAlert(
+            batch_id=row.batch_id,
+            product_id=row.product_id,
+            product_name=row.product_name,
+            batch_number=row.batch_number,
+            current_quantity=row.current_quantity,
+            expiry_date=row.expiry_date,
+            days_until_expiry=row.days_until_expiry,
+            alert_level=alert_level,
+            estimated_value=row.estimated_value,
+            recommended_action=self._get_recommended_action(
+                row.days_until_expiry,
+                row.current_quantity,
+                alert_level
+            ),
+            priority_score=row.priority_score
+        )
+    
+    @expiry_cache.cached
     async def get_expiry_alerts(
         self, 
-        alert_levels: Optional[List[ExpiryAlertLevel]] = None,
+        alert_levels: Optional[Sequence[ExpiryAlertLevel]] = None,
         min_quantity: int = 1,
-        include_expired: bool = False
+        include_expired: bool = False,
+        product_id: Optional[int] = None,
+        limit: Optional[int] = 200,
+        offset: int = 0,
+        after: Optional[Tuple[float, int]] = None
     ) -> List[ExpiryAlert]:
-        """Get all expiry alerts with intelligent prioritization."""
+        """Get expiry alerts with intelligent prioritization.
+        
+        Alerts are ordered by priority score (highest first), then batch id.
+        Page through them with ``limit``/``offset``, or for deep pages pass
+        the ``(priority_score, batch_id)`` of the last alert seen as
+        ``after``. ``limit=None`` returns every matching alert.
+        """
         today = date.today()
         
-        # Build query conditions
-        conditions = [
-            InventoryBatch.is_active == True,
-            InventoryBatch.current_quantity >= min_quantity,
-            Product.is_active == True
-        ]
+        query = self._filter_alerts(
+            select(*self._alert_columns(today)).join(Product),
+            today, alert_levels, min_quantity, include_expired, product_id
+        )
         
-        if not include_expired:
-            conditions.append(InventoryBatch.expiry_date >= today)
+        if after is not None:
+            after_score, after_batch_id = after
+            score = self._alert_score_expression(today)
+            query = query.where(or_(
+                score < after_score,
+                and_(score == after_score, InventoryBatch.id > after_batch_id)
+            ))
         
-        # Execute query
         result = await self.db.execute(
-            select(InventoryBatch, Product)
-            .join(Product)
-            .where(and_(*conditions))
-            .options(selectinload(InventoryBatch.product))
+            query
+            .order_by(desc('priority_score'), InventoryBatch.id)
+            .limit(limit)
+            .offset(offset)
         )
         
-        alerts = []
-        for batch, product in result.all():
-            days_until_expiry = (batch.expiry_date - today).days
-            alert_level = self._calculate_alert_level(days_until_expiry)
-            
-            # Filter by alert levels if specified
-            if alert_levels and alert_level not in alert_levels:
-                continue
-            
-            estimated_value = float(batch.current_quantity * batch.selling_price_per_unit)
-            priority_score = self._calculate_priority_score(
-                days_until_expiry,
-                batch.current_quantity,
-                float(batch.selling_price_per_unit),
-                product.is_controlled_substance
-            )
-            
-            alert = ExpiryAlert(
-                batch_id=batch.id,
-                product_id=product.id,
-                product_name=product.name,
-                batch_number=batch.batch_number,
-                current_quantity=batch.current_quantity,
-                expiry_date=batch.expiry_date,
-                days_until_expiry=days_until_expiry,
-                alert_level=alert_level,
-                estimated_value=estimated_value,
-                recommended_action=self._get_recommended_action(
-                    days_until_expiry, 
-                    batch.current_quantity, 
-                    alert_level
-                ),
-                priority_score=priority_score
-            )
-            alerts.append(alert)
-        
-        # Sort by priority score (highest first)
-        alerts.sort(key=lambda x: x.priority_score, reverse=True)
-        return alerts
+        return [self._alert_from_row(row) for row in result.all()]
     
-    async def get_expiry_summary(self) -> Dict[str, any]:
-        """Get summary statistics for expiry management."""
+    async def stream_expiry_alerts(
+        self,
+        alert_levels: Optional[Sequence[ExpiryAlertLevel]] = None,
+        min_quantity: int = 1,
+        include_expired: bool = False,
+        batch_size: int = 500
+    ) -> AsyncIterator[List[ExpiryAlert]]:
+        """Stream every matching expiry alert in chunks of up to ``batch_size``.
+        
+        Uses the same ordering as ``get_expiry_alerts``; rows are read as
+        they arrive instead of materializing the whole result.
+        """
         today = date.today()
+        query = self._filter_alerts(
+            select(*self._alert_columns(today)).join(Product),
+            today, alert_levels, min_quantity, include_expired
+        )
         
-        # Get counts by alert level
-        result = await self.db.execute(
-            select(
-                func.count(InventoryBatch.id).label('total_batches'),
-                func.sum(InventoryBatch.current_quantity).label('total_quantity'),
-                func.sum(InventoryBatch.current_quantity * InventoryBatch.selling_price_per_unit).label('total_value')
-            )
-            .join(Product)
-            .where(
-                and_(
-                    InventoryBatch.is_active == True,
-                    InventoryBatch.current_quantity > 0,
-                    Product.is_active == True
-                )
-            )
+        result = await self.db.stream(
+            query
+            .order_by(desc('priority_score'), InventoryBatch.id)
+            .execution_options(yield_per=batch_size)
+        )
+        
+        async for rows in result.partitions():
+            yield [self._alert_from_row(row) for row in rows]
+    
+    async def get_alerts_for_product(self, product_id: int) -> List[ExpiryAlert]:
+        """Get expiry alerts for a single product."""
+        return await self.get_expiry_alerts(product_id=product_id, limit=None)
+    
+    @expiry_cache.cached
+    async def get_top_value_alerts(
+        self,
+        limit: int = 10,
+        alert_levels: Optional[Sequence[ExpiryAlertLevel]] = None,
+        min_quantity: int = 1,
+        include_expired: bool = False
+    ) -> List[ExpiryAlert]:
+        """Get the alerts with the highest estimated value at risk."""
+        today = date.today()
+        query = self._filter_alerts(
+            select(*self._alert_columns(today)).join(Product),
+            today, alert_levels, min_quantity, include_expired
         )
-        totals = result.first()
-        
-        # Get expiry breakdown
-        expiry_breakdown = {}
-        for level in ExpiryAlertLevel:
-            if level == ExpiryAlertLevel.CRITICAL:
-                max_days = self.settings.expiry_alert_1_week
-            elif level == ExpiryAlertLevel.HIGH:
-                max_days = self.settings.expiry_alert_1_month
-            elif level == ExpiryAlertLevel.MEDIUM:
-                max_days = self.settings.expiry_alert_3_months
-            elif level == ExpiryAlertLevel.LOW:
-                max_days = self.settings.expiry_alert_6_months
-            else:
-                continue
-            
-            result = await self.db.execute(
-                select(
-                    func.count(InventoryBatch.id).label('count'),
-                    func.sum(InventoryBatch.current_quantity).label('quantity'),
-                    func.sum(InventoryBatch.current_quantity * InventoryBatch.selling_price_per_unit).label('value')
-                )
-                .join(Product)
-                .where(
-                    and_(
-                        InventoryBatch.is_active == True,
-                        InventoryBatch.current_quantity > 0,
-                        Product.is_active == True,
-                        InventoryBatch.expiry_date <= today + timedelta(days=max_days),
-                        InventoryBatch.expiry_date >= today
-                    )
-                )
-            )
-            breakdown = result.first()
-            expiry_breakdown[level.value] = {
-                'batches': breakdown.count or 0,
-                'quantity': breakdown.quantity or 0,
-                'value': float(breakdown.value or 0)
-            }
         
-        # Get expired items
         result = await self.db.execute(
+            query
+            .order_by(desc('estimated_value'), InventoryBatch.expiry_date)
+            .limit(limit)
+        )
+        return [self._alert_from_row(row) for row in result.all()]
+    
+    @expiry_cache.cached
+    async def get_alert_counts_by_level(
+        self,
+        min_quantity: int = 1,
+        include_expired: bool = False
+    ) -> Dict[ExpiryAlertLevel, Tuple[int, float]]:
+        """Get the number of alerts and their total value for each alert level."""
+        today = date.today()
+        level = self._alert_level_expression(today)
+        query = self._filter_alerts(
             select(
+                level.label('alert_level'),
                 func.count(InventoryBatch.id).label('count'),
-                func.sum(InventoryBatch.current_quantity).label('quantity'),
                 func.sum(InventoryBatch.current_quantity * InventoryBatch.selling_price_per_unit).label('value')
+            ).join(Product),
+            today, None, min_quantity, include_expired
+        )
+        
+        result = await self.db.execute(query.group_by(level))
+        
+        counts = {alert_level: (0, 0.0) for alert_level in ExpiryAlertLevel}
+        for row in result.all():
+            counts[ExpiryAlertLevel(row.alert_level)] = (row.count, float(row.value or 0))
+        return counts
+    
+    @expiry_cache.cached
+    async def get_expiry_summary(self) -> Dict[str, any]:
+        """Get summary statistics for expiry management."""
+        today = date.today()
+        quantity = InventoryBatch.current_quantity
+        value = InventoryBatch.current_quantity * InventoryBatch.selling_price_per_unit
+        
+        # Every bucket is aggregated in the same pass with FILTER (WHERE ...);
+        # level buckets are cumulative, e.g. "high" includes "critical"
+        buckets = {'total': None}
+        for level, max_days in self._level_thresholds:
+            buckets[level.value] = and_(
+                InventoryBatch.expiry_date <= today + timedelta(days=max_days),
+                InventoryBatch.expiry_date >= today
             )
+        buckets['expired'] = InventoryBatch.expiry_date < today
+        
+        columns = []
+        for condition in buckets.values():
+            aggregates = [func.count(InventoryBatch.id), func.sum(quantity), func.sum(value)]
+            if condition is not None:
+                aggregates = [aggregate.filter(condition) for aggregate in aggregates]
+            columns.extend(aggregates)
+        
+        result = await self.db.execute(
+            select(*columns)
             .join(Product)
             .where(
-                and_(
-                    InventoryBatch.is_active == True,
-                    InventoryBatch.current_quantity > 0,
-                    Product.is_active == True,
-                    InventoryBatch.expiry_date < today
-                )
+                InventoryBatch.is_active,
+                InventoryBatch.current_quantity > 0,
+                Product.is_active
             )
         )
-        expired = result.first()
+        row = result.one()
         
-        return {
-            'total_batches': totals.total_batches or 0,
-            'total_quantity': totals.total_quantity or 0,
-            'total_value': float(totals.total_value or 0),
-            'expiry_breakdown': expiry_breakdown,
-            'expired': {
-                'batches': expired.count or 0,
-                'quantity': expired.quantity or 0,
-                'value': float(expired.value or 0)
+        stats = {}
+        for index, name in enumerate(buckets):
+            count, total_quantity, total_value = row[index * 3:index * 3 + 3]
+            stats[name] = {
+                'batches': count or 0,
+                'quantity': total_quantity or 0,
+                'value': float(total_value or 0)
             }
+        
+        totals = stats.pop('total')
+        expired = stats.pop('expired')
+        
+        return {
+            'total_batches': totals['batches'],
+            'total_quantity': totals['quantity'],
+            'total_value': totals['value'],
+            'expiry_breakdown': stats,
+            'expired': expired
         }
     
     async def mark_batch_expired(self, batch_id: int, user_id: int) -> bool:
         """Mark a batch as expired and create stock movement record."""
-        from app.services.inventory_service import InventoryService
+        return await self.mark_batches_expired([batch_id], user_id) == 1
+    
+    async def mark_batches_expired(self, batch_ids: Sequence[int], user_id: int) -> int:
+        """Mark batches as expired, recording one stock movement per batch.
+        
+        Batches that are missing or already empty are skipped. Returns the
+        number of batches marked.
+        """
+        if not batch_ids:
+            return 0
         
-        batch = await self.db.execute(
-            select(InventoryBatch).where(InventoryBatch.id == batch_id)
+        pending = and_(
+            InventoryBatch.id.in_(batch_ids),
+            InventoryBatch.current_quantity > 0
         )
-        batch = batch.scalar_one_or_none()
-        
-        if not batch or batch.current_quantity <= 0:
-            return False
-        
-        # Use inventory service to handle the expiry movement
-        inventory_service = InventoryService(self.db)
-        await inventory_service.record_stock_movement(
-            product_id=batch.product_id,
-            batch_id=batch_id,
-            quantity=-batch.current_quantity,
-            movement_type="expired",
-            user_id=user_id,
-            notes=f"Batch {batch.batch_number} marked as expired"
+        
+        # Record the movements first so they capture the quantities written off.
+        # FOR UPDATE keeps concurrent sales from changing those quantities
+        # before the UPDATE below (SQLite already serialises writers).
+        await self.db.execute(
+            insert(StockMovement).from_select(
+                ['product_id', 'batch_id', 'quantity', 'movement_type', 'user_id', 'notes'],
+                select(
+                    InventoryBatch.product_id,
+                    InventoryBatch.id,
+                    -InventoryBatch.current_quantity,
+                    literal(MovementType.EXPIRED.value),
+                    literal(user_id),
+                    literal('Batch ') + InventoryBatch.batch_number + literal(' marked as expired')
+                ).where(pending).with_for_update()
+            )
+        )
+        
+        result = await self.db.execute(
+            update(InventoryBatch)
+            .where(pending)
+            .values(is_expired=True, current_quantity=0)
         )
         
-        batch.is_expired = True
-        batch.current_quantity = 0
         await self.db.commit()
-        return True
+        expiry_cache.clear()
+        inventory_cache.clear()
+        return result.rowcount
@@ -4,12 +4,43 @@ from datetime import datetime, date
 from typing import List, Optional, Dict
 from decimal import Decimal
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func, desc
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, insert, update, and_, case, func, desc
+from sqlalchemy.orm import joinedload, selectinload
 
 from app.models.product import Product
 from app.models.inventory import InventoryBatch, StockMovement, MovementType
 from app.models.user import User
+from app.config import get_settings
+from app.cache import AsyncTTLCache
+
+
+# Stock levels and summaries; cleared whenever batch quantities change
+inventory_cache = AsyncTTLCache(get_settings().inventory_cache_ttl_seconds)
+
+
+def active_stock_by_product():
+    """CTE of the total active stock per product (``product_id``, ``quantity``).
+    
+    Products without any active batch have no row; outer join and treat
+    them as having no stock.
+    """
+    return (
+        select(
+            InventoryBatch.product_id,
+            func.sum(InventoryBatch.current_quantity).label("quantity")
+        )
+        .where(InventoryBatch.is_active == True)
+        .group_by(InventoryBatch.product_id)
+        .cte("stock")
+    )
+
+
+def low_stock_condition(stock, threshold_multiplier: float = 1.0):
+    """Condition for an active product whose total stock is at or below its reorder point."""
+    return and_(
+        Product.is_active == True,
+        func.coalesce(stock.c.quantity, 0) <= Product.reorder_point * threshold_multiplier
+    )
 
 
 class InventoryService:
@@ -33,11 +64,10 @@ class InventoryService:
         batch.current_quantity = batch.initial_quantity
         
         self.db.add(batch)
-        await self.db.commit()
-        await self.db.refresh(batch)
+        await self.db.flush()  # Get batch ID
         
         # Record initial stock movement
-        await self.record_stock_movement(
+        self.record_stock_movement(
             product_id=product_id,
             batch_id=batch.id,
             quantity=batch.initial_quantity,
@@ -47,6 +77,8 @@ class InventoryService:
             notes=f"Initial stock for batch {batch.batch_number}"
         )
         
+        await self.db.commit()
+        inventory_cache.clear()
         return batch
     
     async def get_batch_by_id(self, batch_id: int) -> Optional[InventoryBatch]:
@@ -58,6 +90,13 @@ class InventoryService:
         )
         return result.scalar_one_or_none()
     
+    async def _get_batches_by_ids(self, batch_ids: List[int]) -> Dict[int, InventoryBatch]:
+        """Load several batches in one query, keyed by ID."""
+        result = await self.db.execute(
+            select(InventoryBatch).where(InventoryBatch.id.in_(batch_ids))
+        )
+        return {batch.id: batch for batch in result.scalars()}
+    
     async def get_product_batches(
         self,
         product_id: int,
@@ -80,6 +119,7 @@ class InventoryService:
         )
         return result.scalars().all()
     
+    @inventory_cache.cached
     async def get_available_stock(self, product_id: int) -> int:
         """Get total available stock for a product across all batches."""
         result = await self.db.execute(
@@ -95,14 +135,40 @@ class InventoryService:
         total = result.scalar()
         return total or 0
     
+    async def get_available_stock_bulk(self, product_ids: List[int]) -> Dict[int, int]:
+        """Get unreserved stock for several products in one query.
+        
+        Products without available stock are mapped to 0.
+        """
+        result = await self.db.execute(
+            select(
+                InventoryBatch.product_id,
+                func.sum(InventoryBatch.current_quantity - InventoryBatch.reserved_quantity)
+            )
+            .where(
+                InventoryBatch.product_id.in_(product_ids),
+                InventoryBatch.is_active == True,
+                InventoryBatch.current_quantity > InventoryBatch.reserved_quantity
+            )
+            .group_by(InventoryBatch.product_id)
+        )
+        available = dict.fromkeys(product_ids, 0)
+        available.update(result.all())
+        return available
+    
     async def reserve_stock(
         self,
         product_id: int,
         quantity: int,
         prefer_fifo: bool = True
     ) -> List[Dict]:
-        """Reserve stock for a sale (FIFO by default)."""
-        # Get available batches
+        """Reserve stock for a sale (FIFO by default).
+        
+        Reservations are committed on success. If there is not enough
+        stock, the session is rolled back and ValueError is raised.
+        """
+        # Get available batches, locked until the reservation commits so
+        # concurrent sales cannot reserve the same units
         order_by = (
             InventoryBatch.expiry_date if prefer_fifo 
             else desc(InventoryBatch.expiry_date)
@@ -118,6 +184,8 @@ class InventoryService:
                 )
             )
             .order_by(order_by)
+            .with_for_update()
+            .execution_options(populate_existing=True)
         )
         batches = result.scalars().all()
         
@@ -133,10 +201,26 @@ class InventoryService:
                 continue
             
             reserve_qty = min(remaining_quantity, available)
-            batch.reserved_quantity += reserve_qty
+            
+            # Check and increment in one statement, so a reservation made
+            # since the batch was read is never overwritten
+            result = await self.db.execute(
+                update(InventoryBatch)
+                .where(
+                    InventoryBatch.id == batch.id,
+                    InventoryBatch.current_quantity - InventoryBatch.reserved_quantity >= reserve_qty
+                )
+                .values(reserved_quantity=InventoryBatch.reserved_quantity + reserve_qty)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 0:
+                continue  # Taken by a concurrent sale; try the next batch
+            
+            self.db.expire(batch, ['reserved_quantity'])
             remaining_quantity -= reserve_qty
             
             reservations.append({
+                'product_id': batch.product_id,
                 'batch_id': batch.id,
                 'batch_number': batch.batch_number,
                 'quantity': reserve_qty,
@@ -145,11 +229,9 @@ class InventoryService:
             })
         
         if remaining_quantity > 0:
-            # Not enough stock available
-            # Rollback reservations
-            for reservation in reservations:
-                batch = next(b for b in batches if b.id == reservation['batch_id'])
-                batch.reserved_quantity -= reservation['quantity']
+            # Not enough stock available; rolling back undoes this call's
+            # increments and releases the row locks
+            await self.db.rollback()
             raise ValueError(f"Insufficient stock. Need {quantity}, available {quantity - remaining_quantity}")
         
         await self.db.commit()
@@ -157,8 +239,9 @@ class InventoryService:
     
     async def release_reservation(self, reservations: List[Dict]) -> None:
         """Release stock reservations."""
+        batches = await self._get_batches_by_ids([r['batch_id'] for r in reservations])
         for reservation in reservations:
-            batch = await self.get_batch_by_id(reservation['batch_id'])
+            batch = batches.get(reservation['batch_id'])
             if batch:
                 batch.reserved_quantity = max(0, batch.reserved_quantity - reservation['quantity'])
         
@@ -170,30 +253,57 @@ class InventoryService:
         user_id: int,
         sale_reference: str
     ) -> None:
-        """Confirm sale and update stock quantities."""
+        """Confirm sale and update stock quantities.
+        
+        If any batch no longer holds the reserved units, nothing is
+        written: the session is rolled back and ValueError is raised.
+        """
+        if not reservations:
+            return
+        
+        sold: Dict[int, int] = {}
         for reservation in reservations:
-            batch = await self.get_batch_by_id(reservation['batch_id'])
-            if not batch:
-                continue
-            
-            # Update quantities
-            batch.current_quantity -= reservation['quantity']
-            batch.reserved_quantity -= reservation['quantity']
-            
-            # Record stock movement
-            await self.record_stock_movement(
-                product_id=batch.product_id,
-                batch_id=batch.id,
-                quantity=-reservation['quantity'],
-                movement_type=MovementType.SALE,
-                user_id=user_id,
-                reference_number=sale_reference,
-                notes=f"Sale from batch {batch.batch_number}"
+            sold[reservation['batch_id']] = sold.get(reservation['batch_id'], 0) + reservation['quantity']
+        
+        # Update quantities for every batch in one statement; the decrement
+        # happens in SQL, so there is no read-modify-write window
+        quantity_sold = case(sold, value=InventoryBatch.id)
+        result = await self.db.execute(
+            update(InventoryBatch)
+            .where(
+                InventoryBatch.id.in_(list(sold)),
+                InventoryBatch.current_quantity >= quantity_sold,
+                InventoryBatch.reserved_quantity >= quantity_sold
+            )
+            .values(
+                current_quantity=InventoryBatch.current_quantity - quantity_sold,
+                reserved_quantity=InventoryBatch.reserved_quantity - quantity_sold
             )
+            .execution_options(synchronize_session='fetch')
+        )
+        if result.rowcount != len(sold):
+            await self.db.rollback()
+            raise ValueError("Reserved stock is no longer available for this sale")
         
+        # Record stock movements
+        await self.db.execute(insert(StockMovement), [
+            {
+                'product_id': reservation['product_id'],
+                'batch_id': reservation['batch_id'],
+                'quantity': -reservation['quantity'],
+                'movement_type': MovementType.SALE,
+                'user_id': user_id,
+                'reference_number': sale_reference,
+                'notes': f"Sale from batch {reservation['batch_number']}"
+            }
+            for reservation in reservations
+        ])
+        
+        # Quantities and movements are written in a single commit
         await self.db.commit()
+        inventory_cache.clear()
     
-    async def record_stock_movement(
+    def record_stock_movement(
         self,
         product_id: int,
         quantity: int,
@@ -204,7 +314,11 @@ class InventoryService:
         reference_number: Optional[str] = None,
         notes: Optional[str] = None
     ) -> StockMovement:
-        """Record a stock movement for audit trail."""
+        """Record a stock movement for audit trail.
+        
+        The movement is only added to the session; the caller commits it
+        together with the rest of its unit of work.
+        """
         movement = StockMovement(
             product_id=product_id,
             batch_id=batch_id,
@@ -217,8 +331,6 @@ class InventoryService:
         )
         
         self.db.add(movement)
-        await self.db.commit()
-        await self.db.refresh(movement)
         return movement
     
     async def adjust_stock(
@@ -239,7 +351,7 @@ class InventoryService:
         batch.current_quantity = new_quantity
         
         # Record adjustment movement
-        await self.record_stock_movement(
+        self.record_stock_movement(
             product_id=batch.product_id,
             batch_id=batch_id,
             quantity=adjustment,
@@ -249,6 +361,7 @@ class InventoryService:
         )
         
         await self.db.commit()
+        inventory_cache.clear()
         return True
     
     async def get_stock_movements(
@@ -261,6 +374,80 @@ class InventoryService:
         limit: int = 100
     ) -> List[StockMovement]:
         """Get stock movements with filters."""
+        conditions = self._stock_movement_conditions(
+            product_id, batch_id, movement_type, start_date, end_date
+        )
+        
+        # All three are many-to-one, so join them into the same query
+        query = select(StockMovement).options(
+            joinedload(StockMovement.product, innerjoin=True),
+            joinedload(StockMovement.batch),
+            joinedload(StockMovement.user, innerjoin=True)
+        )
+        
+        if conditions:
+            query = query.where(and_(*conditions))
+        
+        result = await self.db.execute(
+            query.order_by(desc(StockMovement.created_at)).limit(limit)
+        )
+        return result.scalars().all()
+    
+    async def get_stock_movement_log(
+        self,
+        product_id: Optional[int] = None,
+        batch_id: Optional[int] = None,
+        movement_type: Optional[MovementType] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        limit: int = 100
+    ) -> List[Dict]:
+        """Get stock movements with filters as plain rows for read-only listings.
+        
+        Takes the same filters as ``get_stock_movements`` but selects only
+        the columns an audit list shows, without building ORM objects.
+        """
+        conditions = self._stock_movement_conditions(
+            product_id, batch_id, movement_type, start_date, end_date
+        )
+        
+        query = (
+            select(
+                StockMovement.id,
+                StockMovement.movement_type,
+                StockMovement.quantity,
+                StockMovement.reference_number,
+                StockMovement.notes,
+                StockMovement.created_at,
+                StockMovement.product_id,
+                Product.sku.label('product_sku'),
+                Product.name.label('product_name'),
+                StockMovement.batch_id,
+                InventoryBatch.batch_number,
+                User.username
+            )
+            .select_from(StockMovement)
+            .join(Product, StockMovement.product_id == Product.id)
+            .outerjoin(InventoryBatch, StockMovement.batch_id == InventoryBatch.id)
+            .join(User, StockMovement.user_id == User.id)
+        )
+        
+        if conditions:
+            query = query.where(and_(*conditions))
+        
+        result = await self.db.execute(
+            query.order_by(desc(StockMovement.created_at)).limit(limit)
+        )
+        return [dict(row) for row in result.mappings()]
+    
+    def _stock_movement_conditions(
+        self,
+        product_id: Optional[int],
+        batch_id: Optional[int],
+        movement_type: Optional[MovementType],
+        start_date: Optional[datetime],
+        end_date: Optional[datetime]
+    ) -> List:
         conditions = []
         
         if product_id:
@@ -278,70 +465,43 @@ class InventoryService:
         if end_date:
             conditions.append(StockMovement.created_at <= end_date)
         
-        query = select(StockMovement).options(
-            selectinload(StockMovement.product),
-            selectinload(StockMovement.batch),
-            selectinload(StockMovement.user)
-        )
-        
-        if conditions:
-            query = query.where(and_(*conditions))
-        
-        result = await self.db.execute(
-            query.order_by(desc(StockMovement.created_at)).limit(limit)
-        )
-        return result.scalars().all()
+        return conditions
     
+    @inventory_cache.cached
     async def get_inventory_summary(self) -> Dict:
         """Get inventory summary statistics."""
-        # Total products with stock
-        result = await self.db.execute(
-            select(func.count(func.distinct(InventoryBatch.product_id)))
-            .where(
-                and_(
-                    InventoryBatch.is_active == True,
-                    InventoryBatch.current_quantity > 0
-                )
-            )
-        )
-        products_in_stock = result.scalar() or 0
+        # The stock figures come from one pass over active batches, using
+        # FILTER (WHERE ...) for the in-stock condition
+        in_stock = InventoryBatch.current_quantity > 0
         
-        # Total inventory value
-        result = await self.db.execute(
-            select(func.sum(InventoryBatch.current_quantity * InventoryBatch.cost_per_unit))
-            .where(
-                and_(
-                    InventoryBatch.is_active == True,
-                    InventoryBatch.current_quantity > 0
-                )
-            )
+        # Low stock is judged on each product's total, as in
+        # ProductService.get_low_stock_products
+        stock = active_stock_by_product()
+        low_stock_count = (
+            select(func.count(Product.id))
+            .outerjoin(stock, stock.c.product_id == Product.id)
+            .where(low_stock_condition(stock))
+            .scalar_subquery()
         )
-        total_cost_value = result.scalar() or 0
         
         result = await self.db.execute(
-            select(func.sum(InventoryBatch.current_quantity * InventoryBatch.selling_price_per_unit))
-            .where(
-                and_(
-                    InventoryBatch.is_active == True,
-                    InventoryBatch.current_quantity > 0
-                )
-            )
-        )
-        total_selling_value = result.scalar() or 0
-        
-        # Low stock products
-        result = await self.db.execute(
-            select(func.count(func.distinct(Product.id)))
-            .join(InventoryBatch)
-            .where(
-                and_(
-                    Product.is_active == True,
-                    InventoryBatch.is_active == True,
-                    InventoryBatch.current_quantity <= Product.reorder_point
-                )
+            select(
+                # Total products with stock
+                func.count(func.distinct(InventoryBatch.product_id)).filter(in_stock),
+                # Total inventory value
+                func.sum(InventoryBatch.current_quantity * InventoryBatch.cost_per_unit).filter(in_stock),
+                func.sum(InventoryBatch.current_quantity * InventoryBatch.selling_price_per_unit).filter(in_stock),
+                # Low stock products
+                low_stock_count
             )
+            .select_from(InventoryBatch)
+            .where(InventoryBatch.is_active == True)
         )
-        low_stock_products = result.scalar() or 0
+        products_in_stock, total_cost_value, total_selling_value, low_stock_products = result.one()
+        products_in_stock = products_in_stock or 0
+        total_cost_value = total_cost_value or 0
+        total_selling_value = total_selling_value or 0
+        low_stock_products = low_stock_products or 0
         
         return {
             'products_in_stock': products_in_stock,
@@ -1,12 +1,18 @@
 """Point of Sale service for handling transactions and cart management."""
 
+import asyncio
+import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from decimal import Decimal, ROUND_HALF_UP
 from dataclasses import dataclass, field
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import insert, select
+from sqlalchemy.orm import selectinload
 
+from app.config import get_settings
+from app.database import utcnow
 from app.models.product import Product
 from app.models.customer import Customer
 from app.models.sale import Sale, SaleItem, PaymentMethod, SaleStatus
@@ -15,32 +21,60 @@ from app.services.inventory_service import InventoryService
 from app.services.product_service import ProductService
 
 
+def to_cents(amount: Decimal) -> int:
+    """Convert a money amount to whole cents, rounding half up."""
+    return int((amount * 100).quantize(Decimal('1'), ROUND_HALF_UP))
+
+
+def from_cents(cents: int) -> Decimal:
+    """Convert whole cents back to a two-place money amount."""
+    return Decimal(cents).scaleb(-2)
+
+
 @dataclass
 class CartItem:
-    """Cart item data structure."""
+    """Cart item data structure.
+    
+    Money is held as integer cents; the Decimal properties are for callers
+    that write amounts out, e.g. to a Sale.
+    """
     product_id: int
     product_name: str
     sku: str
     quantity: int
-    unit_price: Decimal
-    discount_amount: Decimal = Decimal('0.00')
+    unit_price_cents: int
+    discount_cents: int = 0
     prescription_number: Optional[str] = None
     prescriber_name: Optional[str] = None
     days_supply: Optional[int] = None
     
+    @property
+    def line_total_cents(self) -> int:
+        """Calculate line total after discount, in cents."""
+        return self.quantity * self.unit_price_cents - self.discount_cents
+    
+    @property
+    def unit_price(self) -> Decimal:
+        """Unit price as a money amount."""
+        return from_cents(self.unit_price_cents)
+    
+    @property
+    def discount_amount(self) -> Decimal:
+        """Discount as a money amount."""
+        return from_cents(self.discount_cents)
+    
     @property
     def line_total(self) -> Decimal:
         """Calculate line total after discount."""
-        subtotal = self.quantity * self.unit_price
-        return subtotal - self.discount_amount
+        return from_cents(self.line_total_cents)
     
     @property
     def discount_percentage(self) -> Decimal:
         """Calculate discount percentage."""
-        if self.unit_price == 0:
+        if self.unit_price_cents == 0:
             return Decimal('0.00')
-        subtotal = self.quantity * self.unit_price
-        return (self.discount_amount / subtotal * 100).quantize(Decimal('0.01'))
+        subtotal_cents = self.quantity * self.unit_price_cents
+        return (Decimal(self.discount_cents) / subtotal_cents * 100).quantize(Decimal('0.01'))
 
 
 @dataclass
@@ -48,30 +82,65 @@ class Cart:
     """Shopping cart for POS transactions."""
     items: List[CartItem] = field(default_factory=list)
     customer_id: Optional[int] = None
-    discount_amount: Decimal = Decimal('0.00')
+    discount_cents: int = 0
     tax_rate: Decimal = Decimal('0.00')
+    # Items by product ID, kept in step with ``items``
+    _by_id: Dict[int, CartItem] = field(default_factory=dict, init=False, repr=False, compare=False)
+    
+    def __post_init__(self) -> None:
+        self._by_id = {item.product_id: item for item in self.items}
+    
+    @property
+    def subtotal_cents(self) -> int:
+        """Calculate cart subtotal, in cents."""
+        return sum(item.line_total_cents for item in self.items)
+    
+    @property
+    def total_discount_cents(self) -> int:
+        """Calculate total discount amount, in cents."""
+        return sum(item.discount_cents for item in self.items) + self.discount_cents
+    
+    @property
+    def tax_cents(self) -> int:
+        """Calculate tax amount, in cents."""
+        return self._tax_on(self.subtotal_cents)
+    
+    @property
+    def total_cents(self) -> int:
+        """Calculate cart total, in cents."""
+        subtotal_cents = self.subtotal_cents
+        return subtotal_cents - self.discount_cents + self._tax_on(subtotal_cents)
+    
+    def _tax_on(self, subtotal_cents: int) -> int:
+        taxable_cents = subtotal_cents - self.discount_cents
+        if not self.tax_rate:
+            return 0
+        return int((taxable_cents * self.tax_rate / 100).quantize(Decimal('1'), ROUND_HALF_UP))
+    
+    @property
+    def discount_amount(self) -> Decimal:
+        """Discount as a money amount."""
+        return from_cents(self.discount_cents)
     
     @property
     def subtotal(self) -> Decimal:
         """Calculate cart subtotal."""
-        return sum(item.line_total for item in self.items)
+        return from_cents(self.subtotal_cents)
     
     @property
     def total_discount(self) -> Decimal:
         """Calculate total discount amount."""
-        item_discounts = sum(item.discount_amount for item in self.items)
-        return item_discounts + self.discount_amount
+        return from_cents(self.total_discount_cents)
     
     @property
     def tax_amount(self) -> Decimal:
         """Calculate tax amount."""
-        taxable_amount = self.subtotal - self.discount_amount
-        return (taxable_amount * self.tax_rate / 100).quantize(Decimal('0.01'), ROUND_HALF_UP)
+        return from_cents(self.tax_cents)
     
     @property
     def total(self) -> Decimal:
         """Calculate cart total."""
-        return self.subtotal - self.discount_amount + self.tax_amount
+        return from_cents(self.total_cents)
     
     @property
     def item_count(self) -> int:
@@ -85,14 +154,15 @@ class Cart:
             existing_item.quantity += cart_item.quantity
         else:
             self.items.append(cart_item)
+            self._by_id[cart_item.product_id] = cart_item
     
     def remove_item(self, product_id: int) -> bool:
         """Remove item from cart."""
-        for i, item in enumerate(self.items):
-            if item.product_id == product_id:
-                del self.items[i]
-                return True
-        return False
+        item = self._by_id.pop(product_id, None)
+        if item is None:
+            return False
+        self.items.remove(item)
+        return True
     
     def update_item_quantity(self, product_id: int, quantity: int) -> bool:
         """Update item quantity."""
@@ -106,32 +176,78 @@ class Cart:
     
     def find_item(self, product_id: int) -> Optional[CartItem]:
         """Find item in cart by product ID."""
-        for item in self.items:
-            if item.product_id == product_id:
-                return item
-        return None
+        return self._by_id.get(product_id)
     
     def clear(self) -> None:
         """Clear all items from cart."""
         self.items.clear()
+        self._by_id.clear()
         self.customer_id = None
-        self.discount_amount = Decimal('0.00')
+        self.discount_cents = 0
+
+
+class CartStore:
+    """In-process cart storage with idle expiry.
+    
+    Carts are kept per session ID and dropped once they have not been
+    touched for ``ttl_seconds``, so abandoned sessions do not pile up.
+    At most ``max_carts`` are kept; beyond that the least recently
+    touched cart is dropped even if it has not expired.
+    """
+    
+    def __init__(self, ttl_seconds: float, max_carts: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_carts = max_carts
+        # Least recently touched first, so expired carts are at the front
+        self._carts: "OrderedDict[str, Tuple[float, Cart]]" = OrderedDict()
+    
+    def _purge_expired(self, now: float) -> None:
+        while self._carts:
+            expires_at, _ = next(iter(self._carts.values()))
+            if expires_at > now:
+                break
+            self._carts.popitem(last=False)
+    
+    def get(self, session_id: str) -> Cart:
+        """Get or create the cart for a session and refresh its expiry."""
+        now = time.monotonic()
+        self._purge_expired(now)
+        
+        entry = self._carts.pop(session_id, None)
+        cart = entry[1] if entry is not None else Cart()
+        self._carts[session_id] = (now + self.ttl_seconds, cart)
+        while len(self._carts) > self.max_carts:
+            self._carts.popitem(last=False)
+        return cart
+    
+    def discard(self, session_id: str) -> Optional[Cart]:
+        """Remove the cart for a session, returning it if there was one."""
+        entry = self._carts.pop(session_id, None)
+        return entry[1] if entry is not None else None
+
+
+# Shared by all POSService instances in this process
+cart_store = CartStore(get_settings().cart_ttl_seconds, get_settings().max_carts)
+
+# Last sale number handed out in this process, as (prefix, sequence);
+# sales are only written when they commit, so the database alone would
+# repeat uncommitted numbers
+_sale_number_lock = asyncio.Lock()
+_last_sale_number: Tuple[str, int] = ("", 0)
 
 
 class POSService:
     """Service for Point of Sale operations."""
     
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, carts: Optional[CartStore] = None):
         self.db = db
         self.inventory_service = InventoryService(db)
         self.product_service = ProductService(db)
-        self._carts: Dict[str, Cart] = {}  # Session-based carts
+        self._carts = carts if carts is not None else cart_store  # Session-based carts
     
     def get_cart(self, session_id: str) -> Cart:
         """Get or create cart for session."""
-        if session_id not in self._carts:
-            self._carts[session_id] = Cart()
-        return self._carts[session_id]
+        return self._carts.get(session_id)
     
     async def add_to_cart(
         self,
@@ -142,7 +258,7 @@ class POSService:
     ) -> Cart:
         """Add product to cart."""
         # Get product details
-        product = await self.product_service.get_product_by_id(product_id)
+        product = await self.product_service.get_cart_product(product_id)
         if not product or not product.is_active:
             raise ValueError("Product not found or inactive")
         
@@ -157,7 +273,7 @@ class POSService:
             product_name=product.name,
             sku=product.sku,
             quantity=quantity,
-            unit_price=product.selling_price,
+            unit_price_cents=to_cents(product.selling_price),
             prescription_number=prescription_info.get('prescription_number') if prescription_info else None,
             prescriber_name=prescription_info.get('prescriber_name') if prescription_info else None,
             days_supply=prescription_info.get('days_supply') if prescription_info else None
@@ -209,16 +325,16 @@ class POSService:
                 raise ValueError("Product not found in cart")
             
             if discount_amount:
-                item.discount_amount = discount_amount
+                item.discount_cents = to_cents(discount_amount)
             elif discount_percentage:
-                subtotal = item.quantity * item.unit_price
-                item.discount_amount = (subtotal * discount_percentage / 100).quantize(Decimal('0.01'))
+                subtotal_cents = item.quantity * item.unit_price_cents
+                item.discount_cents = int((subtotal_cents * discount_percentage / 100).quantize(Decimal('1'), ROUND_HALF_UP))
         else:
             # Apply discount to entire cart
             if discount_amount:
-                cart.discount_amount = discount_amount
+                cart.discount_cents = to_cents(discount_amount)
             elif discount_percentage:
-                cart.discount_amount = (cart.subtotal * discount_percentage / 100).quantize(Decimal('0.01'))
+                cart.discount_cents = int((cart.subtotal_cents * discount_percentage / 100).quantize(Decimal('1'), ROUND_HALF_UP))
         
         return cart
     
@@ -236,6 +352,29 @@ class POSService:
         cart.customer_id = customer_id
         return cart
     
+    async def get_customer_with_sales(self, customer_id: int) -> Optional[Customer]:
+        """Get customer together with their sales history."""
+        result = await self.db.execute(
+            select(Customer)
+            .options(selectinload(Customer.sales))
+            .where(Customer.id == customer_id)
+        )
+        return result.scalar_one_or_none()
+    
+    async def get_sale_with_items(self, sale_id: int) -> Optional[Sale]:
+        """Get a sale with its line items and their products (e.g. for receipts).
+        
+        Loads in two queries regardless of the number of line items.
+        """
+        result = await self.db.execute(
+            select(Sale)
+            .options(
+                selectinload(Sale.sale_items).joinedload(SaleItem.product, innerjoin=True)
+            )
+            .where(Sale.id == sale_id)
+        )
+        return result.scalar_one_or_none()
+    
     async def process_sale(
         self,
         session_id: str,
@@ -251,37 +390,53 @@ class POSService:
         if not cart.items:
             raise ValueError("Cart is empty")
         
-        if amount_paid < cart.total:
+        # Totals are derived from the items on every access; read them once
+        subtotal = from_cents(cart.subtotal_cents)
+        total = from_cents(cart.total_cents)
+        if amount_paid < total:
             raise ValueError("Insufficient payment amount")
         
+        # Check stock for every line up front, in one query
+        available = await self.inventory_service.get_available_stock_bulk(
+            [item.product_id for item in cart.items]
+        )
+        for item in cart.items:
+            if available[item.product_id] < item.quantity:
+                raise ValueError(
+                    f"Insufficient stock for {item.product_name}. "
+                    f"Available: {available[item.product_id]}, Requested: {item.quantity}"
+                )
+        
         # Generate sale number
         sale_number = await self._generate_sale_number()
         
         # Reserve stock for all items
         reservations = []
+        line_reservations = []  # Per cart item, in cart order
         try:
             for item in cart.items:
                 item_reservations = await self.inventory_service.reserve_stock(
                     product_id=item.product_id,
                     quantity=item.quantity
                 )
+                line_reservations.append(item_reservations)
                 reservations.extend(item_reservations)
             
             # Create sale record
             sale = Sale(
                 sale_number=sale_number,
-                subtotal=cart.subtotal,
+                subtotal=subtotal,
                 tax_amount=cart.tax_amount,
                 discount_amount=cart.total_discount,
-                total_amount=cart.total,
+                total_amount=total,
                 payment_method=payment_method,
                 payment_reference=payment_reference,
                 amount_paid=amount_paid,
-                change_given=amount_paid - cart.total,
+                change_given=amount_paid - total,
                 customer_id=cart.customer_id,
                 cashier_id=cashier_id,
                 status=SaleStatus.COMPLETED,
-                completed_at=datetime.utcnow()
+                completed_at=utcnow()
             )
             
             # Add insurance information if provided
@@ -293,32 +448,25 @@ class POSService:
             self.db.add(sale)
             await self.db.flush()  # Get sale ID
             
-            # Create sale items
-            reservation_index = 0
-            for item in cart.items:
-                # Find corresponding reservations for this item
-                item_reservations = []
-                for _ in range(item.quantity):
-                    if reservation_index < len(reservations):
-                        item_reservations.append(reservations[reservation_index])
-                        reservation_index += 1
-                
-                # Create sale item (simplified - using first reservation for batch info)
+            # Create sale items with a single bulk INSERT
+            sale_item_rows = []
+            for item, item_reservations in zip(cart.items, line_reservations):
+                # Simplified - using first reservation for batch info
                 first_reservation = item_reservations[0] if item_reservations else None
-                sale_item = SaleItem(
-                    sale_id=sale.id,
-                    product_id=item.product_id,
-                    quantity=item.quantity,
-                    unit_price=item.unit_price,
-                    discount_amount=item.discount_amount,
-                    line_total=item.line_total,
-                    prescription_number=item.prescription_number,
-                    prescriber_name=item.prescriber_name,
-                    days_supply=item.days_supply,
-                    batch_number=first_reservation['batch_number'] if first_reservation else None,
-                    inventory_batch_id=first_reservation['batch_id'] if first_reservation else None
-                )
-                self.db.add(sale_item)
+                sale_item_rows.append({
+                    'sale_id': sale.id,
+                    'product_id': item.product_id,
+                    'quantity': item.quantity,
+                    'unit_price': item.unit_price,
+                    'discount_amount': item.discount_amount,
+                    'line_total': item.line_total,
+                    'prescription_number': item.prescription_number,
+                    'prescriber_name': item.prescriber_name,
+                    'days_supply': item.days_supply,
+                    'batch_number': first_reservation['batch_number'] if first_reservation else None,
+                    'inventory_batch_id': first_reservation['batch_id'] if first_reservation else None
+                })
+            await self.db.execute(insert(SaleItem), sale_item_rows)
             
             # Confirm stock movements
             await self.inventory_service.confirm_sale(
@@ -329,7 +477,7 @@ class POSService:
             
             # Update customer loyalty points if applicable
             if cart.customer_id:
-                await self._update_customer_loyalty(cart.customer_id, cart.total)
+                await self._update_customer_loyalty(cart.customer_id, total)
             
             await self.db.commit()
             
@@ -346,23 +494,27 @@ class POSService:
     
     async def _generate_sale_number(self) -> str:
         """Generate unique sale number."""
+        global _last_sale_number
         today = datetime.now()
         prefix = f"POS{today.strftime('%Y%m%d')}"
         
-        # Get last sale number for today
-        result = await self.db.execute(
-            select(Sale.sale_number)
-            .where(Sale.sale_number.like(f"{prefix}%"))
-            .order_by(Sale.sale_number.desc())
-            .limit(1)
-        )
-        last_sale = result.scalar_one_or_none()
-        
-        if last_sale:
-            # Extract sequence number and increment
-            sequence = int(last_sale[-4:]) + 1
-        else:
-            sequence = 1
+        async with _sale_number_lock:
+            # Get last sale number for today
+            result = await self.db.execute(
+                select(Sale.sale_number)
+                .where(Sale.sale_number.like(f"{prefix}%"))
+                .order_by(Sale.sale_number.desc())
+                .limit(1)
+            )
+            last_sale = result.scalar_one_or_none()
+            last_sequence = int(last_sale[len(prefix):]) if last_sale else 0
+            
+            # Numbers issued here for sales that have not committed yet
+            issued_prefix, issued_sequence = _last_sale_number
+            if issued_prefix == prefix:
+                last_sequence = max(last_sequence, issued_sequence)
+            sequence = last_sequence + 1
+            _last_sale_number = (prefix, sequence)
         
         return f"{prefix}{sequence:04d}"
     
@@ -378,9 +530,10 @@ class POSService:
             points_earned = int(amount)
             customer.loyalty_points += points_earned
             customer.total_spent += amount
-            customer.last_visit = datetime.utcnow()
+            customer.last_visit = utcnow()
     
     def clear_cart(self, session_id: str) -> None:
         """Clear cart for session."""
-        if session_id in self._carts:
-            self._carts[session_id].clear()
+        cart = self._carts.discard(session_id)
+        if cart is not None:
+            cart.clear()
@@ -1,16 +1,70 @@
 """Product management service."""
 
-from typing import List, Optional
+import re
+from decimal import Decimal
+from typing import AsyncIterator, List, NamedTuple, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_
-from sqlalchemy.orm import selectinload
+from sqlalchemy import bindparam, select, update, and_, or_, func, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import raiseload, selectinload
+from sqlalchemy.sql import Select
 
-from app.models.product import Product, ProductCategory
-from app.models.inventory import InventoryBatch
+from app.cache import AsyncTTLCache
+from app.config import get_settings
+from app.models.product import Product, ProductCategory, product_search_document, product_search_text
+from app.services.inventory_service import active_stock_by_product, low_stock_condition
+
+
+# Shared across requests; cleared whenever a product is created or changed
+product_cache = AsyncTTLCache(get_settings().product_cache_ttl_seconds)
+
+
+def prefix_tsquery(query: str) -> str:
+    """Turn search input into to_tsquery() syntax matching every word.
+
+    The last word only has to be a prefix, so "ibuprofen tab" finds
+    "Ibuprofen Tablets". Punctuation is dropped since it is tsquery
+    syntax; input without any word characters gives an empty string.
+    """
+    words = re.findall(r"\w+", query)
+    return " & ".join(words) + ":*" if words else ""
+
+
+class CartProduct(NamedTuple):
+    """Immutable snapshot of the product fields used by the cart."""
+    id: int
+    name: str
+    sku: str
+    selling_price: Decimal
+    is_active: bool
+
+
+# Single-product lookups run on every scan. Building the statements once
+# skips re-constructing them and recomputing their cache keys per call;
+# only the bound value changes.
+_PRODUCT_BY_ID = (
+    select(Product)
+    .options(selectinload(Product.inventory_batches))
+    .where(Product.id == bindparam("product_id"))
+)
+_CART_PRODUCT_BY_ID = select(
+    Product.id,
+    Product.name,
+    Product.sku,
+    Product.selling_price,
+    Product.is_active
+).where(Product.id == bindparam("product_id"))
+_PRODUCT_BY_SKU = select(Product).where(Product.sku == bindparam("sku"))
+_PRODUCT_BY_BARCODE = select(Product).where(Product.barcode == bindparam("barcode"))
 
 
 class ProductService:
-    """Service for managing products and categories."""
+    """Service for managing products and categories.
+
+    List methods return products with every relationship set to raise on
+    access, so a caller that needs e.g. the category must load it
+    explicitly instead of issuing one query per product.
+    """
 
     def __init__(self, db: AsyncSession):
         self.db = db
@@ -19,31 +73,35 @@ class ProductService:
         """Create a new product."""
         product = Product(**product_data)
         self.db.add(product)
-        await self.db.commit()
+        try:
+            await self.db.commit()
+        except IntegrityError:
+            await self.db.rollback()
+            raise
+        product_cache.clear()
         await self.db.refresh(product)
         return product
 
     async def get_product_by_id(self, product_id: int) -> Optional[Product]:
         """Get product by ID with inventory batches."""
-        result = await self.db.execute(
-            select(Product)
-            .options(selectinload(Product.inventory_batches))
-            .where(Product.id == product_id)
-        )
+        result = await self.db.execute(_PRODUCT_BY_ID, {"product_id": product_id})
         return result.scalar_one_or_none()
 
+    @product_cache.cached
+    async def get_cart_product(self, product_id: int) -> Optional[CartProduct]:
+        """Get the cart fields of a product, cached between requests."""
+        result = await self.db.execute(_CART_PRODUCT_BY_ID, {"product_id": product_id})
+        row = result.one_or_none()
+        return CartProduct(*row) if row else None
+
     async def get_product_by_sku(self, sku: str) -> Optional[Product]:
         """Get product by SKU."""
-        result = await self.db.execute(
-            select(Product).where(Product.sku == sku)
-        )
+        result = await self.db.execute(_PRODUCT_BY_SKU, {"sku": sku})
         return result.scalar_one_or_none()
 
     async def get_product_by_barcode(self, barcode: str) -> Optional[Product]:
         """Get product by barcode."""
-        result = await self.db.execute(
-            select(Product).where(Product.barcode == barcode)
-        )
+        result = await self.db.execute(_PRODUCT_BY_BARCODE, {"barcode": barcode})
         return result.scalar_one_or_none()
 
     async def search_products(
@@ -53,17 +111,62 @@ class ProductService:
         active_only: bool = True,
         limit: int = 50
     ) -> List[Product]:
-        """Search products by name, generic name, or brand name."""
+        """Search products by name, generic name, brand name or SKU.
+
+        An empty query lists products in ID order, as get_all_products does.
+        """
+        if not query.strip():
+            return await self.get_all_products(category_id, active_only, limit=limit)
+
+        result = await self.db.execute(
+            self._search_query(query, category_id, active_only).limit(limit)
+        )
+        return result.scalars().all()
+
+    async def search_products_stream(
+        self,
+        query: str,
+        category_id: Optional[int] = None,
+        active_only: bool = True,
+        chunk_size: int = 100
+    ) -> AsyncIterator[Product]:
+        """Yield every product matching a search, fetched ``chunk_size`` rows at a time.
+
+        For exports and reports that need all matches; memory stays bounded
+        by the chunk size rather than the number of results.
+        """
+        result = await self.db.stream_scalars(
+            self._search_query(query, category_id, active_only)
+            .order_by(Product.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        async for product in result:
+            yield product
+
+    def _search_query(self, query: str, category_id: Optional[int], active_only: bool) -> Select:
         conditions = []
+        query = query.strip()
 
-        # Text search
-        search_conditions = [
-            Product.name.ilike(f"%{query}%"),
-            Product.generic_name.ilike(f"%{query}%"),
-            Product.brand_name.ilike(f"%{query}%"),
-            Product.sku.ilike(f"%{query}%")
-        ]
-        conditions.append(or_(*search_conditions))
+        # Text search; an empty query adds no condition. Queries shorter
+        # than a trigram match name/SKU prefixes. Multi-word queries use
+        # PostgreSQL full-text search, with the last word matched as a
+        # prefix since it is usually still being typed; otherwise name,
+        # generic name, brand name and SKU are each matched as a substring
+        # so PostgreSQL needs a single trigram index probe. Search terms are
+        # always sent as named parameters so each branch compiles to the
+        # same SQL on every call
+        tsquery = prefix_tsquery(query) if " " in query else None
+        if 0 < len(query) < 3:
+            pattern = bindparam("pattern", f"{query}%")
+            conditions.append(or_(Product.name.ilike(pattern), Product.sku.ilike(pattern)))
+        elif tsquery and self.db.get_bind().dialect.name == "postgresql":
+            terms = bindparam("terms", tsquery)
+            conditions.append(
+                product_search_document.op("@@")(func.to_tsquery(text("'english'"), terms))
+            )
+        elif query:
+            pattern = bindparam("pattern", f"%{query.lower()}%")
+            conditions.append(product_search_text.like(pattern))
 
         # Category filter
         if category_id:
@@ -73,41 +176,46 @@ class ProductService:
         if active_only:
             conditions.append(Product.is_active == True)
 
-        result = await self.db.execute(
-            select(Product)
-            .where(and_(*conditions))
-            .limit(limit)
-        )
-        return result.scalars().all()
+        return select(Product).options(raiseload("*")).where(*conditions)
 
     async def get_all_products(
         self,
         category_id: Optional[int] = None,
         active_only: bool = True,
         skip: int = 0,
-        limit: int = 100
+        limit: int = 100,
+        after_id: Optional[int] = None
     ) -> List[Product]:
-        """Get all products with pagination."""
+        """Get all products with pagination, ordered by ID.
+
+        Pass the last ID of the previous page as ``after_id`` to seek
+        straight to the next page; ``skip`` still works but has to read
+        past every skipped row.
+        """
         conditions = []
 
+        if after_id is not None:
+            conditions.append(Product.id > after_id)
+
         if category_id:
             conditions.append(Product.category_id == category_id)
 
         if active_only:
             conditions.append(Product.is_active == True)
 
-        query = select(Product)
+        query = select(Product).options(raiseload("*"))
         if conditions:
             query = query.where(and_(*conditions))
 
         result = await self.db.execute(
-            query.offset(skip).limit(limit)
+            query.order_by(Product.id).offset(skip).limit(limit)
         )
         return result.scalars().all()
 
     async def update_product(self, product_id: int, update_data: dict) -> Optional[Product]:
         """Update product information."""
-        product = await self.get_product_by_id(product_id)
+        # Plain lookup; the batches loaded by get_product_by_id are not needed here
+        product = await self.db.get(Product, product_id)
         if not product:
             return None
 
@@ -115,33 +223,40 @@ class ProductService:
             if hasattr(product, key):
                 setattr(product, key, value)
 
-        await self.db.commit()
+        try:
+            await self.db.commit()
+        except IntegrityError:
+            await self.db.rollback()
+            raise
+        product_cache.clear()
         await self.db.refresh(product)
         return product
 
     async def delete_product(self, product_id: int) -> bool:
         """Soft delete a product (mark as inactive)."""
-        product = await self.get_product_by_id(product_id)
-        if not product:
+        result = await self.db.execute(
+            update(Product)
+            .where(Product.id == product_id)
+            .values(is_active=False)
+        )
+        if result.rowcount == 0:
             return False
 
-        product.is_active = False
         await self.db.commit()
+        product_cache.clear()
         return True
 
     async def get_low_stock_products(self, threshold_multiplier: float = 1.0) -> List[Product]:
-        """Get products with low stock levels."""
-        # This will be implemented with inventory service
-        # For now, return products where current stock is below reorder point
+        """Get products whose total active stock is at or below their reorder point."""
+        # Stock per product is aggregated once in a CTE and compared in the
+        # same query, so each product is returned once. Products without
+        # any active batch count as having no stock.
+        stock = active_stock_by_product()
         result = await self.db.execute(
             select(Product)
-            .join(InventoryBatch)
-            .where(
-                and_(
-                    Product.is_active == True,
-                    InventoryBatch.current_quantity <= Product.reorder_point * threshold_multiplier
-                )
-            )
+            .options(raiseload("*"))
+            .outerjoin(stock, stock.c.product_id == Product.id)
+            .where(low_stock_condition(stock, threshold_multiplier))
         )
         return result.scalars().all()
 
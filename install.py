@@ -5,6 +5,7 @@ Pathway Pharmacy POS System - Robust Installation Script
 This script tries multiple installation approaches to handle build issues.
 """
 
+import shutil
 import subprocess
 import sys
 import os
@@ -12,16 +13,17 @@ from pathlib import Path
 
 
 def run_command_safe(command, description):
-    """Run a command safely and return success status."""
+    """Run a command (argument list, no shell) and return success status.
+    
+    Output is streamed straight to the console rather than captured.
+    """
     print(f"📦 {description}...")
     try:
-        result = subprocess.run(command, shell=True, check=True, capture_output=True, text=True)
+        subprocess.run(command, check=True)
         print(f"✓ {description} completed successfully")
         return True
     except subprocess.CalledProcessError as e:
-        print(f"✗ {description} failed")
-        if e.stderr:
-            print(f"   Error: {e.stderr.strip()}")
+        print(f"✗ {description} failed (exit code {e.returncode})")
         return False
     except Exception as e:
         print(f"✗ {description} failed: {e}")
@@ -30,31 +32,42 @@ def run_command_safe(command, description):
 
 def try_installation_methods():
     """Try different installation methods until one works."""
+    pip = [sys.executable, "-m", "pip", "install"]
+    core_packages = ["fastapi", "uvicorn", "sqlalchemy", "aiosqlite", "pydantic", "python-dotenv"]
+    
+    # Only bootstrap uv when it is not already available; like pip, have it
+    # byte-compile what it installs
+    uv_install = [
+        "pip", "install", "--python", sys.executable, "--compile-bytecode",
+        "-r", "requirements-minimal.txt"
+    ]
+    uv = shutil.which("uv")
+    if uv:
+        uv_commands = [[uv] + uv_install]
+    else:
+        uv_commands = [pip + ["--no-input", "uv"], [sys.executable, "-m", "uv"] + uv_install]
     
     methods = [
         {
             "name": "uv with minimal requirements",
-            "commands": [
-                "pip install uv",
-                "uv pip install -r requirements-minimal.txt"
-            ]
+            "commands": uv_commands
         },
         {
             "name": "pip with minimal requirements", 
             "commands": [
-                "pip install -r requirements-minimal.txt"
+                pip + ["-r", "requirements-minimal.txt"]
             ]
         },
         {
             "name": "pip with individual core packages",
             "commands": [
-                "pip install fastapi uvicorn sqlalchemy aiosqlite pydantic python-dotenv"
+                pip + core_packages
             ]
         },
         {
             "name": "pip with pre-compiled wheels only",
             "commands": [
-                "pip install --only-binary=all fastapi uvicorn sqlalchemy aiosqlite pydantic python-dotenv"
+                pip + ["--only-binary=:all:"] + core_packages
             ]
         }
     ]
@@ -64,7 +77,7 @@ def try_installation_methods():
         success = True
         
         for command in method['commands']:
-            if not run_command_safe(command, f"Running: {command}"):
+            if not run_command_safe(command, f"Running: {' '.join(command)}"):
                 success = False
                 break
         
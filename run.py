@@ -10,20 +10,22 @@ import asyncio
 import subprocess
 import sys
 import os
+from importlib.util import find_spec
 from pathlib import Path
 
 
+REQUIRED_MODULES = ("fastapi", "uvicorn", "sqlalchemy", "pydantic")
+
+
 def check_dependencies():
-    """Check if required dependencies are installed."""
-    try:
-        import fastapi
-        import uvicorn
-        import sqlalchemy
-        import pydantic
-        print("✓ All required dependencies are installed")
-        return True
-    except ImportError as e:
-        print(f"✗ Missing dependency: {e}")
+    """Check if required dependencies are installed.
+    
+    Uses find_spec so the packages are located without importing them;
+    the server process imports them anyway.
+    """
+    missing = [name for name in REQUIRED_MODULES if find_spec(name) is None]
+    if missing:
+        print(f"✗ Missing dependency: {', '.join(missing)}")
         print("Please install dependencies with:")
         print("  python setup.py                     (automatic setup)")
         print("  uv pip install -r requirements.txt  (recommended - faster)")
@@ -31,6 +33,9 @@ def check_dependencies():
         print("\nFor PostgreSQL support, also run:")
         print("  uv pip install -r requirements-postgresql.txt")
         return False
+    
+    print("✓ All required dependencies are installed")
+    return True
 
 
 async def init_database():
@@ -77,13 +82,9 @@ def start_server(host="127.0.0.1", port=8000, reload=True):
     print("Press Ctrl+C to stop the server")
     
     try:
-        subprocess.run([
-            sys.executable, "-m", "uvicorn",
-            "app.main:app",
-            "--host", host,
-            "--port", str(port),
-            "--reload" if reload else "--no-reload"
-        ])
+        # Run in this process; with reload, uvicorn starts its own watcher
+        import uvicorn
+        uvicorn.run("app.main:app", host=host, port=port, reload=reload)
     except KeyboardInterrupt:
         print("\nServer stopped")
     except Exception as e:
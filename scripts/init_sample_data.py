@@ -6,10 +6,14 @@ import sys
 import os
 from datetime import date, timedelta
 from decimal import Decimal
+from typing import List
+
+from sqlalchemy import insert, select
 
 # Add the parent directory to the path so we can import our modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from app.config import settings
 from app.database import create_tables, AsyncSessionLocal
 from app.models.user import User, UserRole
 from app.models.product import Product, ProductCategory
@@ -18,75 +22,65 @@ from app.models.customer import Customer
 from passlib.context import CryptContext
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.sample_data_bcrypt_rounds
+)
+
+
+async def insert_rows(db, model: type, rows: List[dict], key: str) -> List[int]:
+    """Insert ``rows`` with one executemany and return their IDs in order.
+    
+    IDs are matched back to rows by the unique ``key`` column, taken from
+    RETURNING where the database supports it for executemany and from a
+    follow-up SELECT otherwise (older SQLite versions).
+    """
+    key_column = getattr(model, key)
+    values = [row[key] for row in rows]
+    if db.get_bind().dialect.insert_executemany_returning:
+        result = await db.execute(insert(model).returning(key_column, model.id), rows)
+    else:
+        await db.execute(insert(model), rows)
+        result = await db.execute(select(key_column, model.id).where(key_column.in_(values)))
+    ids = dict(result.all())
+    return [ids[value] for value in values]
 
 
 async def create_sample_data():
     """Create sample data for testing the POS system."""
     
+    # bcrypt is deliberately slow; hash the passwords in parallel on worker
+    # threads while the other tables are filled, and add the users last
+    loop = asyncio.get_running_loop()
+    password_hashes = asyncio.gather(*(
+        loop.run_in_executor(None, pwd_context.hash, password)
+        for password in ("admin123", "pharma123", "cashier123")
+    ))
+    
     async with AsyncSessionLocal() as db:
         try:
-            # Create sample users
-            print("Creating sample users...")
-            
-            admin_user = User(
-                username="admin",
-                email="admin@pharmacy.com",
-                full_name="System Administrator",
-                hashed_password=pwd_context.hash("admin123"),
-                role=UserRole.ADMIN,
-                is_active=True,
-                is_verified=True
-            )
-            
-            pharmacist_user = User(
-                username="pharmacist",
-                email="pharmacist@pharmacy.com",
-                full_name="Dr. Jane Smith",
-                hashed_password=pwd_context.hash("pharma123"),
-                role=UserRole.PHARMACIST,
-                license_number="PH123456",
-                phone="(555) 123-4567",
-                is_active=True,
-                is_verified=True
-            )
-            
-            cashier_user = User(
-                username="cashier",
-                email="cashier@pharmacy.com",
-                full_name="John Doe",
-                hashed_password=pwd_context.hash("cashier123"),
-                role=UserRole.CASHIER,
-                phone="(555) 987-6543",
-                is_active=True,
-                is_verified=True
-            )
-            
-            db.add_all([admin_user, pharmacist_user, cashier_user])
-            await db.flush()
-            
             # Create product categories
             print("Creating product categories...")
             
             categories = [
-                ProductCategory(name="Pain Relief", description="Pain management medications"),
-                ProductCategory(name="Antibiotics", description="Antibiotic medications"),
-                ProductCategory(name="Vitamins", description="Vitamins and supplements"),
-                ProductCategory(name="Cold & Flu", description="Cold and flu medications"),
-                ProductCategory(name="Diabetes", description="Diabetes management products"),
-                ProductCategory(name="Heart Health", description="Cardiovascular medications"),
-                ProductCategory(name="OTC", description="Over-the-counter medications")
+                dict(name="Pain Relief", description="Pain management medications"),
+                dict(name="Antibiotics", description="Antibiotic medications"),
+                dict(name="Vitamins", description="Vitamins and supplements"),
+                dict(name="Cold & Flu", description="Cold and flu medications"),
+                dict(name="Diabetes", description="Diabetes management products"),
+                dict(name="Heart Health", description="Cardiovascular medications"),
+                dict(name="OTC", description="Over-the-counter medications")
             ]
             
-            db.add_all(categories)
-            await db.flush()
+            category_ids = await insert_rows(db, ProductCategory, categories, "name")
             
             # Create sample products
             print("Creating sample products...")
             
             products = [
                 # Pain Relief
-                Product(
+                dict(
                     name="Ibuprofen 200mg Tablets",
                     generic_name="Ibuprofen",
                     brand_name="Advil",
@@ -100,9 +94,9 @@ async def create_sample_data():
                     selling_price=Decimal("35.99"),
                     min_stock_level=50,
                     reorder_point=25,
-                    category_id=categories[0].id
+                    category_id=category_ids[0]
                 ),
-                Product(
+                dict(
                     name="Acetaminophen 500mg Tablets",
                     generic_name="Acetaminophen",
                     brand_name="Tylenol",
@@ -116,11 +110,11 @@ async def create_sample_data():
                     selling_price=Decimal("29.99"),
                     min_stock_level=75,
                     reorder_point=30,
-                    category_id=categories[0].id
+                    category_id=category_ids[0]
                 ),
                 
                 # Antibiotics
-                Product(
+                dict(
                     name="Amoxicillin 500mg Capsules",
                     generic_name="Amoxicillin",
                     sku="AMX500-30",
@@ -133,9 +127,9 @@ async def create_sample_data():
                     min_stock_level=30,
                     reorder_point=15,
                     requires_prescription=True,
-                    category_id=categories[1].id
+                    category_id=category_ids[1]
                 ),
-                Product(
+                dict(
                     name="Azithromycin 250mg Tablets",
                     generic_name="Azithromycin",
                     brand_name="Z-Pack",
@@ -149,11 +143,11 @@ async def create_sample_data():
                     min_stock_level=20,
                     reorder_point=10,
                     requires_prescription=True,
-                    category_id=categories[1].id
+                    category_id=category_ids[1]
                 ),
                 
                 # Vitamins
-                Product(
+                dict(
                     name="Vitamin D3 1000 IU Tablets",
                     generic_name="Cholecalciferol",
                     sku="VTD1000-100",
@@ -165,9 +159,9 @@ async def create_sample_data():
                     selling_price=Decimal("51.99"),
                     min_stock_level=40,
                     reorder_point=20,
-                    category_id=categories[2].id
+                    category_id=category_ids[2]
                 ),
-                Product(
+                dict(
                     name="Multivitamin Adult Tablets",
                     sku="MVI-ADULT-100",
                     barcode="123456789015",
@@ -177,11 +171,11 @@ async def create_sample_data():
                     selling_price=Decimal("87.99"),
                     min_stock_level=25,
                     reorder_point=12,
-                    category_id=categories[2].id
+                    category_id=category_ids[2]
                 ),
                 
                 # Cold & Flu
-                Product(
+                dict(
                     name="Dextromethorphan Cough Syrup",
                     generic_name="Dextromethorphan HBr",
                     brand_name="Robitussin DM",
@@ -194,11 +188,11 @@ async def create_sample_data():
                     selling_price=Decimal("39.99"),
                     min_stock_level=30,
                     reorder_point=15,
-                    category_id=categories[3].id
+                    category_id=category_ids[3]
                 ),
                 
                 # Diabetes
-                Product(
+                dict(
                     name="Metformin 500mg Tablets",
                     generic_name="Metformin HCl",
                     sku="MET500-100",
@@ -211,12 +205,11 @@ async def create_sample_data():
                     min_stock_level=60,
                     reorder_point=30,
                     requires_prescription=True,
-                    category_id=categories[4].id
+                    category_id=category_ids[4]
                 )
             ]
             
-            db.add_all(products)
-            await db.flush()
+            product_ids = await insert_rows(db, Product, products, "sku")
             
             # Create inventory batches with various expiry dates
             print("Creating inventory batches...")
@@ -224,7 +217,7 @@ async def create_sample_data():
             today = date.today()
             batches = []
             
-            for i, product in enumerate(products):
+            for i, (product, product_id) in enumerate(zip(products, product_ids)):
                 # Create 2-3 batches per product with different expiry dates
                 batch_count = 2 if i % 2 == 0 else 3
                 
@@ -242,14 +235,14 @@ async def create_sample_data():
                     
                     expiry_date = today + timedelta(days=expiry_days)
                     
-                    batch = InventoryBatch(
-                        product_id=product.id,
-                        batch_number=f"BATCH{product.id:03d}{j+1:02d}",
+                    batch = dict(
+                        product_id=product_id,
+                        batch_number=f"BATCH{product_id:03d}{j+1:02d}",
                         lot_number=f"LOT{i+1:04d}{j+1}",
                         initial_quantity=100 + (i * 10),
                         current_quantity=80 + (i * 8),  # Some stock has been sold
-                        cost_per_unit=product.cost_price,
-                        selling_price_per_unit=product.selling_price,
+                        cost_per_unit=product["cost_price"],
+                        selling_price_per_unit=product["selling_price"],
                         expiry_date=expiry_date,
                         supplier_name=f"Supplier {(i % 3) + 1}",
                         purchase_order_number=f"PO{1000 + i + j}",
@@ -257,14 +250,13 @@ async def create_sample_data():
                     )
                     batches.append(batch)
             
-            db.add_all(batches)
-            await db.flush()
+            await db.execute(insert(InventoryBatch), batches)
             
             # Create sample customers
             print("Creating sample customers...")
             
             customers = [
-                Customer(
+                dict(
                     first_name="Akosua",
                     last_name="Mensah",
                     email="akosua.mensah@gmail.com",
@@ -279,7 +271,7 @@ async def create_sample_data():
                     loyalty_points=150,
                     total_spent=Decimal("1850.75")
                 ),
-                Customer(
+                dict(
                     first_name="Kwame",
                     last_name="Asante",
                     email="kwame.asante@yahoo.com",
@@ -294,7 +286,7 @@ async def create_sample_data():
                     loyalty_points=75,
                     total_spent=Decimal("950.50")
                 ),
-                Customer(
+                dict(
                     first_name="Ama",
                     last_name="Osei",
                     email="ama.osei@hotmail.com",
@@ -311,7 +303,47 @@ async def create_sample_data():
                 )
             ]
             
-            db.add_all(customers)
+            await db.execute(insert(Customer), customers)
+            
+            # Create sample users
+            print("Creating sample users...")
+            
+            admin_hash, pharmacist_hash, cashier_hash = await password_hashes
+            
+            admin_user = User(
+                username="admin",
+                email="admin@pharmacy.com",
+                full_name="System Administrator",
+                hashed_password=admin_hash,
+                role=UserRole.ADMIN,
+                is_active=True,
+                is_verified=True
+            )
+            
+            pharmacist_user = User(
+                username="pharmacist",
+                email="pharmacist@pharmacy.com",
+                full_name="Dr. Jane Smith",
+                hashed_password=pharmacist_hash,
+                role=UserRole.PHARMACIST,
+                license_number="PH123456",
+                phone="(555) 123-4567",
+                is_active=True,
+                is_verified=True
+            )
+            
+            cashier_user = User(
+                username="cashier",
+                email="cashier@pharmacy.com",
+                full_name="John Doe",
+                hashed_password=cashier_hash,
+                role=UserRole.CASHIER,
+                phone="(555) 987-6543",
+                is_active=True,
+                is_verified=True
+            )
+            
+            db.add_all([admin_user, pharmacist_user, cashier_user])
             
             await db.commit()
             print("Sample data created successfully!")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Give existing customers tables database defaults for their timestamps.
+
+``customers.created_at`` and ``updated_at`` are filled in by the
+database. Tables created by earlier versions have NOT NULL timestamp
+columns without a DEFAULT, so inserting customers fails until this
+script has run once.
+
+On PostgreSQL the DEFAULT is added in place. SQLite cannot change a
+column's default, so the table is rebuilt with the current definition
+and its rows copied over. Running the script again is harmless.
+"""
+
+import asyncio
+import sys
+import os
+
+from sqlalchemy import MetaData, insert, inspect, select
+from sqlalchemy.schema import CreateTable, DropTable
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine
+from app.models.customer import Customer
+
+TIMESTAMP_COLUMNS = ("created_at", "updated_at")
+
+
+def _columns_missing_defaults(connection) -> list:
+    """Names of the timestamp columns that have no database default."""
+    columns = inspect(connection).get_columns(Customer.__tablename__)
+    return [
+        column["name"] for column in columns
+        if column["name"] in TIMESTAMP_COLUMNS and column.get("default") is None
+    ]
+
+
+def _rebuild_sqlite_table(connection, table):
+    """Recreate ``table`` from its model definition, keeping its rows."""
+    existing = {column["name"] for column in inspect(connection).get_columns(table.name)}
+    columns = [column.name for column in table.columns if column.name in existing]
+
+    # Only the table itself; its indexes are created once it has its real name
+    new_table = table.to_metadata(MetaData(), name=f"_{table.name}_new")
+
+    connection.exec_driver_sql("PRAGMA foreign_keys=OFF")
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {new_table.name}")
+    connection.execute(CreateTable(new_table))
+    connection.execute(
+        insert(new_table).from_select(columns, select(*[table.c[name] for name in columns]))
+    )
+    connection.execute(DropTable(table))
+    connection.exec_driver_sql(f"ALTER TABLE {new_table.name} RENAME TO {table.name}")
+    for index in table.indexes:
+        index.create(connection)
+
+
+def migrate_customer_timestamps(connection):
+    """Add the missing timestamp defaults on ``connection``."""
+    missing = _columns_missing_defaults(connection)
+    if not missing:
+        print("Customer timestamps already have database defaults")
+        return
+
+    table = Customer.__table__
+    if connection.dialect.name == "sqlite":
+        _rebuild_sqlite_table(connection, table)
+    else:
+        for name in missing:
+            connection.exec_driver_sql(
+                f"ALTER TABLE {table.name} ALTER COLUMN {name} SET DEFAULT now()"
+            )
+    print(f"Added database defaults to customers.{', customers.'.join(missing)}")
+
+
+async def main():
+    """Run the migration in a single transaction."""
+    async with engine.begin() as conn:
+        await conn.run_sync(migrate_customer_timestamps)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Convert enum columns from member names to values, once per database.
+
+Earlier versions stored ``users.role``, ``stock_movements.movement_type``,
+``sales.payment_method`` and ``sales.status`` with SQLAlchemy's ``Enum``
+type: member names (``ADMIN``) rather than values (``admin``), and on
+PostgreSQL as native ENUM types. The models now use plain strings.
+
+On PostgreSQL each native ENUM column is converted to VARCHAR with its
+values renamed, its CHECK constraint is added and the old type dropped.
+Elsewhere the stored names are rewritten in place. Running the script
+again is harmless.
+"""
+
+import asyncio
+import sys
+import os
+
+from sqlalchemy import case
+from sqlalchemy.schema import AddConstraint
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine, enum_columns, native_enum_columns
+
+
+def _renamed_values(enum_cls) -> dict:
+    """Map each member name that differs from its value to the value."""
+    return {member.name: member.value for member in enum_cls if member.name != member.value}
+
+
+def _convert_native_enum(connection, table, column, enum_cls, type_name: str):
+    """Turn a PostgreSQL ENUM column into VARCHAR holding the member values."""
+    quote = connection.dialect.identifier_preparer.quote
+    name = quote(column.name)
+    whens = " ".join(
+        f"WHEN '{old}' THEN '{new}'" for old, new in _renamed_values(enum_cls).items()
+    )
+    using = f"CASE {name}::text {whens} ELSE {name}::text END" if whens else f"{name}::text"
+    connection.exec_driver_sql(
+        f"ALTER TABLE {quote(table.name)} ALTER COLUMN {name} "
+        f"TYPE VARCHAR({column.type.length}) USING {using}"
+    )
+    connection.exec_driver_sql(f"DROP TYPE IF EXISTS {quote(type_name)}")
+
+    for constraint in table.constraints:
+        if constraint.info.get("column") == column.name:
+            connection.execute(AddConstraint(constraint))
+
+
+def migrate_enum_columns(connection):
+    """Migrate every enum column on ``connection``."""
+    native = native_enum_columns(connection)
+
+    for table, column, enum_cls in enum_columns():
+        type_name = native.get((table.name, column.name))
+        if type_name is not None:
+            _convert_native_enum(connection, table, column, enum_cls, type_name)
+            print(f"Converted {table.name}.{column.name} from ENUM {type_name}")
+            continue
+
+        renamed = _renamed_values(enum_cls)
+        result = connection.execute(
+            table.update()
+            .where(column.in_(list(renamed)))
+            .values({column: case(renamed, value=column)})
+        )
+        print(f"Updated {result.rowcount} rows in {table.name}.{column.name}")
+
+
+async def main():
+    """Run the migration in a single transaction."""
+    # Register every model's table
+    from app.models import user, product, inventory, customer, sale
+
+    async with engine.begin() as conn:
+        await conn.run_sync(migrate_enum_columns)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Make existing PostgreSQL timestamp columns timezone aware, once per database.
+
+Every timestamp column is now ``DateTime(timezone=True)`` and the app
+writes timezone-aware UTC datetimes. ``create_all`` leaves the columns of
+existing tables alone, so databases created by earlier versions still have
+``timestamp without time zone`` columns, into which asyncpg refuses to
+write aware datetimes.
+
+Each such column is converted to ``timestamptz``. Earlier versions stored
+naive UTC times, so the existing values are read as UTC. SQLite has no
+timezone-aware column type and needs nothing. Running the script again is
+harmless.
+"""
+
+import asyncio
+import sys
+import os
+
+from sqlalchemy import DateTime, text
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import Base, engine
+
+
+def _naive_timestamp_columns(connection) -> set:
+    """``(table, column)`` pairs stored as ``timestamp without time zone``."""
+    rows = connection.execute(text(
+        "SELECT table_name, column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() "
+        "AND data_type = 'timestamp without time zone'"
+    ))
+    return {(row.table_name, row.column_name) for row in rows}
+
+
+def migrate_timestamp_timezones(connection):
+    """Convert every naive column the models declare timezone aware on ``connection``."""
+    if connection.dialect.name != "postgresql":
+        print("Nothing to do: only PostgreSQL has timezone-aware timestamp columns")
+        return
+
+    quote = connection.dialect.identifier_preparer.quote
+    naive = _naive_timestamp_columns(connection)
+
+    for table in Base.metadata.sorted_tables:
+        for column in table.columns:
+            if not (isinstance(column.type, DateTime) and column.type.timezone):
+                continue
+            if (table.name, column.name) not in naive:
+                continue
+            name = quote(column.name)
+            connection.exec_driver_sql(
+                f"ALTER TABLE {quote(table.name)} ALTER COLUMN {name} "
+                f"TYPE TIMESTAMP WITH TIME ZONE USING {name} AT TIME ZONE 'UTC'"
+            )
+            print(f"Converted {table.name}.{column.name} to timestamptz")
+
+
+async def main():
+    """Run the migration in a single transaction."""
+    # Register every model's table
+    from app.models import user, product, inventory, customer, sale
+
+    async with engine.begin() as conn:
+        await conn.run_sync(migrate_timestamp_timezones)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
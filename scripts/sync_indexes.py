@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Bring an existing database's indexes in line with the models.
+
+``create_all`` skips tables that already exist, so indexes added to the
+models never reach databases created by an earlier version, and indexes
+removed from them keep being maintained on every write. Run this script
+after each upgrade: it creates the missing indexes and drops the retired
+ones. Running it again is harmless.
+
+On PostgreSQL indexes are built and dropped ``CONCURRENTLY`` so writes are
+not blocked meanwhile. If a concurrent build is interrupted it leaves an
+invalid index behind; drop it by hand and run the script again.
+"""
+
+import asyncio
+import sys
+import os
+
+from sqlalchemy import text
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import Base, engine
+
+# Indexes removed from the models that databases created by earlier
+# versions may still have
+RETIRED_INDEXES = (
+    "ix_batch_expiry_active",
+    "ix_products_search_trgm",
+    "ix_products_search_tsv",
+)
+
+
+def _existing_indexes(connection) -> set:
+    """Names of the indexes in the database.
+
+    Read from the catalog because SQLAlchemy's inspector leaves out
+    expression indexes on SQLite.
+    """
+    if connection.dialect.name == "postgresql":
+        query = "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()"
+    else:
+        query = "SELECT name FROM sqlite_master WHERE type = 'index'"
+    return set(connection.execute(text(query)).scalars())
+
+
+def _existing_tables(connection) -> set:
+    """Names of the tables in the database."""
+    return set(connection.dialect.get_table_names(connection))
+
+
+def sync_indexes(connection):
+    """Create missing model indexes and drop retired ones on ``connection``."""
+    concurrently = connection.dialect.name == "postgresql"
+    existing = _existing_indexes(connection)
+    tables = _existing_tables(connection)
+
+    for name in RETIRED_INDEXES:
+        if name in existing:
+            option = "CONCURRENTLY " if concurrently else ""
+            connection.execute(text(f"DROP INDEX {option}IF EXISTS {name}"))
+            print(f"Dropped retired index {name}")
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            if concurrently:
+                index.dialect_kwargs["postgresql_concurrently"] = True
+            # create() applies the index's ddl_if() conditions, as create_all does
+            index.create(connection)
+            print(f"Created index {index.name}")
+
+
+async def main():
+    """Sync the indexes, outside a transaction on PostgreSQL."""
+    # Register every model's table
+    from app.models import user, product, inventory, customer, sale
+
+    async with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.run_sync(sync_indexes)
+        await conn.commit()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -5,23 +5,36 @@ Pathway Pharmacy POS System - Setup Script
 This script automatically sets up the Pathway POS system using uv for fast dependency installation.
 """
 
+import argparse
+import shutil
 import subprocess
 import sys
 import os
 from pathlib import Path
 
+# How to invoke uv; resolved once by install_uv()
+_UV_COMMAND = ["uv"]
+
+# Installation profile -> (requirements file, description)
+PROFILES = {
+    "full": ("requirements.txt", "full installation"),
+    "minimal": ("requirements-minimal.txt", "minimal installation"),
+    "core": ("requirements-minimal.txt", "core installation"),
+}
+
 
 def run_command(command, description):
-    """Run a command and handle errors."""
+    """Run a command (argument list, no shell) and handle errors."""
     print(f"📦 {description}...")
     try:
-        result = subprocess.run(command, shell=True, check=True, capture_output=True, text=True)
+        subprocess.run(command, check=True, capture_output=True, text=True)
         print(f"✓ {description} completed successfully")
         return True
-    except subprocess.CalledProcessError as e:
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        # Without a shell, a missing executable raises FileNotFoundError
         print(f"✗ {description} failed:")
-        print(f"   Command: {command}")
-        print(f"   Error: {e.stderr}")
+        print(f"   Command: {' '.join(command)}")
+        print(f"   Error: {getattr(e, 'stderr', None) or e}")
         return False
 
 
@@ -37,18 +50,37 @@ def check_python_version():
 
 def install_uv():
     """Install uv if not already installed."""
-    try:
-        subprocess.run(["uv", "--version"], check=True, capture_output=True)
+    global _UV_COMMAND
+    uv_path = shutil.which("uv")
+    if uv_path:
+        _UV_COMMAND = [uv_path]
         print("✓ uv is already installed")
         return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        print("📦 Installing uv...")
-        return run_command("pip install uv", "uv installation")
 
+    print("📦 Installing uv...")
+    if not run_command([sys.executable, "-m", "pip", "install", "uv"], "uv installation"):
+        return False
+    # pip may put the uv script outside PATH, so run it through this interpreter
+    _UV_COMMAND = [sys.executable, "-m", "uv"]
+    return True
+
+
+def install_requirements(requirements_files, description):
+    """Install several requirements files with one uv call, falling back to pip."""
+    args = []
+    for requirements_file in requirements_files:
+        args += ["-r", requirements_file]
+    # Like pip, have uv byte-compile what it installs so the first server
+    # start doesn't pay for it; uv does this in parallel
+    if run_command(_UV_COMMAND + ["pip", "install", "--compile-bytecode"] + args, description):
+        return True
+
+    print(f"\n💡 Trying fallback to pip for {description}...")
+    return run_command([sys.executable, "-m", "pip", "install"] + args, f"fallback {description}")
 
-def install_dependencies():
-    """Install project dependencies using uv with fallback options."""
 
+def choose_profile():
+    """Ask which installation profile to use."""
     print("\n📦 Installation Options:")
     print("   1. Full installation (recommended)")
     print("   2. Minimal installation (if having build issues)")
@@ -57,58 +89,66 @@ def install_dependencies():
     while True:
         choice = input("\nChoose installation type (1/2/3) [1]: ").strip()
         if choice in ['', '1']:
-            requirements_file = "requirements.txt"
-            install_type = "full installation"
-            break
+            return "full"
         elif choice == '2':
-            requirements_file = "requirements-minimal.txt"
-            install_type = "minimal installation"
-            break
+            return "minimal"
         elif choice == '3':
-            requirements_file = "requirements-minimal.txt"
-            install_type = "core installation"
-            break
+            return "core"
         else:
             print("Please enter 1, 2, or 3")
 
+
+def install_dependencies(args):
+    """Install project dependencies using uv with fallback options.
+
+    Prompts for the profile and optional features unless any of the
+    command-line options were given.
+    """
+    interactive = not (
+        args.profile or args.with_postgres or args.with_optional or args.with_dev or args.yes
+    )
+    profile = choose_profile() if interactive else (args.profile or "full")
+    requirements_file, install_type = PROFILES[profile]
+
     if not Path(requirements_file).exists():
         print(f"✗ {requirements_file} not found")
         return False
 
-    # Install main dependencies
-    success = run_command(f"uv pip install -r {requirements_file}", install_type)
-
-    if not success:
-        print(f"\n💡 Trying fallback to pip for {install_type}...")
-        success = run_command(f"pip install -r {requirements_file}", f"fallback {install_type}")
-
-    if success and choice in ['', '1']:
-        # Ask about optional features for full installation
+    extra_files = []
+    if interactive and profile == "full":
+        # Ask about optional features for full installation up front, so
+        # everything is resolved and installed by a single uv invocation
         print("\n📋 Optional Features:")
 
         # PostgreSQL support
         pg_choice = input("Install PostgreSQL support? (y/N): ").strip().lower()
-        if pg_choice in ['y', 'yes']:
-            print("📦 Installing PostgreSQL dependencies...")
-            pg_success = run_command("uv pip install -r requirements-postgresql.txt", "PostgreSQL dependencies")
-            if not pg_success:
-                run_command("pip install -r requirements-postgresql.txt", "PostgreSQL dependencies (fallback)")
+        args.with_postgres = pg_choice in ['y', 'yes']
 
         # Optional features
         opt_choice = input("Install optional features (PDF, Excel, Barcode)? (y/N): ").strip().lower()
-        if opt_choice in ['y', 'yes']:
-            print("📦 Installing optional dependencies...")
-            opt_success = run_command("uv pip install -r requirements-optional.txt", "optional dependencies")
-            if not opt_success:
-                print("⚠️  Some optional features failed to install")
-                print("   You can install them later with:")
-                print("   uv pip install -r requirements-optional.txt")
+        args.with_optional = opt_choice in ['y', 'yes']
 
         # Development tools
         dev_choice = input("Install development tools? (y/N): ").strip().lower()
-        if dev_choice in ['y', 'yes']:
-            print("📦 Installing development dependencies...")
-            run_command("uv pip install -r requirements-dev.txt", "development dependencies")
+        args.with_dev = dev_choice in ['y', 'yes']
+
+    if args.with_postgres:
+        extra_files.append("requirements-postgresql.txt")
+    if args.with_optional:
+        extra_files.append("requirements-optional.txt")
+    if args.with_dev:
+        extra_files.append("requirements-dev.txt")
+
+    success = install_requirements([requirements_file] + extra_files, install_type)
+
+    if not success and extra_files:
+        # Don't let an optional package block the core install
+        print("\n⚠️  Optional dependencies failed to install, retrying without them...")
+        success = install_requirements([requirements_file], install_type)
+        if success:
+            print("   You can install them later with:")
+            for extra_file in extra_files:
+                print(f"   uv pip install -r {extra_file}")
 
     return success
 
@@ -127,7 +167,7 @@ def setup_environment():
         return False
     
     try:
-        env_file.write_text(env_example.read_text())
+        shutil.copyfile(env_example, env_file)
         print("✓ Created .env file from .env.example")
         print("   You can customize settings in .env if needed")
         return True
@@ -138,6 +178,37 @@ def setup_environment():
 
 def main():
     """Main setup function."""
+    parser = argparse.ArgumentParser(
+        description="Set up the Pathway Pharmacy POS System",
+        epilog="Without any options the script asks interactively."
+    )
+    parser.add_argument(
+        "--profile",
+        choices=sorted(PROFILES),
+        help="Installation type (default: full)"
+    )
+    parser.add_argument(
+        "--with-postgres",
+        action="store_true",
+        help="Install PostgreSQL support"
+    )
+    parser.add_argument(
+        "--with-optional",
+        action="store_true",
+        help="Install optional features (PDF, Excel, Barcode)"
+    )
+    parser.add_argument(
+        "--with-dev",
+        action="store_true",
+        help="Install development tools"
+    )
+    parser.add_argument(
+        "--yes", "-y",
+        action="store_true",
+        help="Don't prompt; use the defaults for anything not given"
+    )
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("🏥 Pathway Pharmacy POS System - Setup")
     print("   Fast setup using uv for dependency management")
@@ -154,9 +225,12 @@ def main():
         sys.exit(1)
     
     # Install dependencies
-    if not install_dependencies():
+    if not install_dependencies(args):
         print("\n💡 Trying fallback to pip...")
-        if not run_command("pip install -r requirements.txt", "fallback dependency installation"):
+        if not run_command(
+            [sys.executable, "-m", "pip", "install", "-r", "requirements.txt"],
+            "fallback dependency installation"
+        ):
             print("\n⚠️  Dependency installation failed. Common solutions:")
             print("   1. Make sure you have Python 3.8+ installed")
             print("   2. Try running: python -m pip install --upgrade pip")
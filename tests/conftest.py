@@ -0,0 +1,88 @@
+"""Shared test configuration."""
+
+import asyncio
+import os
+
+# Run the tests against a private in-memory database rather than whatever
+# DATABASE_URL (or .env) points at. This has to happen before app.database
+# creates the engine; set TEST_DATABASE_URL to test against another database.
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL", "sqlite:///:memory:")
+
+import pytest
+from pytest_asyncio import is_async_test
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+
+from app.database import AsyncSessionLocal, create_tables, drop_tables, engine
+from app.services.expiry_service import expiry_cache
+from app.services.inventory_service import inventory_cache
+from app.services.product_service import product_cache
+
+
+if engine.dialect.name == "sqlite":
+    # pysqlite defers BEGIN until the first write, so RELEASE of a test's
+    # SAVEPOINT would commit for real; emit BEGIN ourselves instead
+    @event.listens_for(engine.sync_engine, "connect")
+    def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+    
+    @event.listens_for(engine.sync_engine, "begin")
+    def _begin_sqlite_transaction(connection):
+        connection.exec_driver_sql("BEGIN")
+
+
+def _release_connections():
+    """Forget pooled connections opened on an event loop that is going away.
+    
+    An in-memory database exists only inside its single connection, so
+    that one is kept.
+    """
+    if not isinstance(engine.pool, StaticPool):
+        engine.sync_engine.dispose(close=False)
+
+
+@pytest.fixture
+async def db_session():
+    """Create a database session whose changes are rolled back after the test.
+    
+    The session runs inside an outer transaction, so its commits only
+    release a SAVEPOINT and the shared sample data stays untouched.
+    """
+    # Entries cached by earlier tests may reflect rolled-back changes
+    for cache in (expiry_cache, inventory_cache, product_cache):
+        cache.clear()
+    
+    async with engine.connect() as connection:
+        transaction = await connection.begin()
+        async with AsyncSessionLocal(
+            bind=connection, join_transaction_mode="create_savepoint"
+        ) as session:
+            yield session
+        await transaction.rollback()
+
+
+def pytest_collection_modifyitems(items):
+    """Run every async test on the session-wide event loop.
+    
+    db_session and the session-scoped fixtures hold engine connections
+    opened on that loop.
+    """
+    session_loop = pytest.mark.asyncio(loop_scope="session")
+    for item in items:
+        if is_async_test(item):
+            item.add_marker(session_loop, append=False)
+
+
+def pytest_sessionstart(session):
+    """Create the schema once, before any test or fixture runs."""
+    async def setup():
+        await create_tables()
+        _release_connections()
+    
+    asyncio.run(setup())
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """Drop the schema after the last test."""
+    _release_connections()
+    asyncio.run(drop_tables())
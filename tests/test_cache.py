@@ -0,0 +1,110 @@
+"""Tests for the in-process async TTL cache."""
+
+import asyncio
+
+import pytest
+
+from app import cache
+from app.cache import AsyncTTLCache
+
+
+class FakeClock:
+    """Stand-in for ``time.monotonic`` that only moves when told to."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Freeze the cache's clock."""
+    fake = FakeClock()
+    monkeypatch.setattr(cache.time, "monotonic", fake)
+    return fake
+
+
+def counting_factory(value):
+    """Build a factory returning ``value`` that counts its calls."""
+    calls = []
+
+    async def factory():
+        calls.append(None)
+        return value
+
+    return factory, calls
+
+
+class TestAsyncTTLCache:
+    """Test cases for AsyncTTLCache."""
+
+    async def test_entries_expire(self, clock):
+        """Test that values are recomputed once their TTL has passed."""
+        ttl_cache = AsyncTTLCache(ttl_seconds=10)
+        factory, calls = counting_factory("value")
+
+        assert await ttl_cache.get_or_set("key", factory) == "value"
+        clock.now += 9
+        assert await ttl_cache.get_or_set("key", factory) == "value"
+        assert len(calls) == 1
+
+        clock.now += 1
+        assert await ttl_cache.get_or_set("key", factory) == "value"
+        assert len(calls) == 2
+
+    async def test_expired_entries_are_purged_on_store(self, clock):
+        """Test that storing a value drops entries that have expired."""
+        ttl_cache = AsyncTTLCache(ttl_seconds=10)
+        for key in range(5):
+            await ttl_cache.get_or_set(key, counting_factory(key)[0])
+        assert len(ttl_cache) == 5
+
+        clock.now += 10
+        await ttl_cache.get_or_set("fresh", counting_factory("fresh")[0])
+        assert len(ttl_cache) == 1
+
+    async def test_oldest_entry_evicted_beyond_maxsize(self, clock):
+        """Test that at most ``maxsize`` entries are kept, dropping the oldest."""
+        ttl_cache = AsyncTTLCache(ttl_seconds=10, maxsize=2)
+        for key in ("a", "b", "c"):
+            await ttl_cache.get_or_set(key, counting_factory(key)[0])
+        assert len(ttl_cache) == 2
+
+        factory, calls = counting_factory("a")
+        await ttl_cache.get_or_set("a", factory)
+        assert len(calls) == 1
+
+        factory, calls = counting_factory("c")
+        await ttl_cache.get_or_set("c", factory)
+        assert calls == []
+
+    async def test_concurrent_misses_are_coalesced(self):
+        """Test that concurrent misses for one key compute the value once."""
+        ttl_cache = AsyncTTLCache(ttl_seconds=10)
+        release = asyncio.Event()
+        calls = []
+
+        async def factory():
+            calls.append(None)
+            await release.wait()
+            return "value"
+
+        tasks = [asyncio.create_task(ttl_cache.get_or_set("key", factory)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await asyncio.gather(*tasks) == ["value"] * 5
+        assert len(calls) == 1
+
+    async def test_clear_discards_values_computed_before_it(self):
+        """Test that a value computed across a clear() is not stored."""
+        ttl_cache = AsyncTTLCache(ttl_seconds=10)
+
+        async def factory():
+            ttl_cache.clear()
+            return "stale"
+
+        assert await ttl_cache.get_or_set("key", factory) == "stale"
+        assert len(ttl_cache) == 0
@@ -0,0 +1,54 @@
+"""Tests for database-generated customer timestamps."""
+
+from datetime import datetime
+
+from sqlalchemy import MetaData, create_engine, insert, select
+
+from app.models.customer import Customer
+from scripts.migrate_customer_timestamps import migrate_customer_timestamps
+
+
+class TestCustomerTimestamps:
+    """Test cases for Customer.created_at/updated_at."""
+
+    async def test_filled_in_by_database(self, db_session):
+        """Test that a new customer gets timestamps from the database."""
+        customer = Customer(first_name="Ama", last_name="Mensah")
+        db_session.add(customer)
+        await db_session.commit()
+
+        assert customer.created_at is not None
+        assert customer.updated_at is not None
+
+    async def test_migration_adds_defaults_to_old_tables(self):
+        """Test that the migration gives an old customers table working defaults."""
+        metadata = MetaData()
+        table = Customer.__table__.to_metadata(metadata)
+        for name in ("created_at", "updated_at"):
+            table.c[name].server_default = None
+
+        sync_engine = create_engine("sqlite://")
+        with sync_engine.begin() as connection:
+            metadata.create_all(connection)
+            connection.execute(insert(table).values(
+                first_name="Kofi", last_name="Boateng", email="kofi@example.com",
+                created_at=datetime(2024, 1, 2), updated_at=datetime(2024, 1, 2)
+            ))
+
+            migrate_customer_timestamps(connection)
+            # A second run finds nothing to do
+            migrate_customer_timestamps(connection)
+
+            connection.execute(insert(Customer.__table__).values(first_name="Esi", last_name="Owusu"))
+            rows = connection.execute(
+                select(Customer.first_name, Customer.created_at).order_by(Customer.id)
+            ).all()
+            # The inspector skips expression indexes on SQLite, so ask the catalog
+            indexes = set(connection.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'customers'"
+            ).scalars())
+
+        assert rows[0].first_name == "Kofi"
+        assert rows[0].created_at == datetime(2024, 1, 2)
+        assert rows[1].created_at is not None
+        assert {index.name for index in Customer.__table__.indexes} <= indexes
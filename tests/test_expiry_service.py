@@ -1,130 +1,117 @@
 """Tests for the expiry service and alert algorithm."""
 
 import pytest
-import asyncio
 from datetime import date, timedelta
 from decimal import Decimal
 
-from app.database import AsyncSessionLocal, create_tables, drop_tables
+from app.api.expiry import get_critical_expiry_alerts
+from app.database import AsyncSessionLocal
 from app.models.product import Product, ProductCategory
 from app.models.inventory import InventoryBatch
-from app.services.expiry_service import ExpiryService, ExpiryAlertLevel
+from app.services.expiry_service import ExpiryService, ExpiryAlertLevel, expiry_cache
 
-
-@pytest.fixture(scope="session")
-def event_loop():
-    """Create an instance of the default event loop for the test session."""
-    loop = asyncio.get_event_loop_policy().new_event_loop()
-    yield loop
-    loop.close()
+# Unit cost and selling price shared by the sample product and its batches
+COST = Decimal("10.00")
+PRICE = Decimal("15.00")
 
 
 @pytest.fixture(scope="session")
-async def setup_database():
-    """Set up test database."""
-    await create_tables()
-    yield
-    await drop_tables()
-
-
-@pytest.fixture
-async def db_session(setup_database):
-    """Create a database session for testing."""
-    async with AsyncSessionLocal() as session:
-        yield session
-
-
-@pytest.fixture
-async def sample_data(db_session):
-    """Create sample data for testing."""
-    # Create category
-    category = ProductCategory(name="Test Category", description="Test category")
-    db_session.add(category)
-    await db_session.flush()
-    
-    # Create product
-    product = Product(
-        name="Test Medicine",
-        sku="TEST001",
-        cost_price=Decimal("10.00"),
-        selling_price=Decimal("15.00"),
-        category_id=category.id
-    )
-    db_session.add(product)
-    await db_session.flush()
-    
-    # Create batches with different expiry dates
-    today = date.today()
-    batches = [
-        # Critical: expires in 3 days
-        InventoryBatch(
-            product_id=product.id,
-            batch_number="CRITICAL001",
-            initial_quantity=50,
-            current_quantity=30,
-            cost_per_unit=Decimal("10.00"),
-            selling_price_per_unit=Decimal("15.00"),
-            expiry_date=today + timedelta(days=3)
-        ),
-        # High: expires in 20 days
-        InventoryBatch(
-            product_id=product.id,
-            batch_number="HIGH001",
-            initial_quantity=100,
-            current_quantity=75,
-            cost_per_unit=Decimal("10.00"),
-            selling_price_per_unit=Decimal("15.00"),
-            expiry_date=today + timedelta(days=20)
-        ),
-        # Medium: expires in 60 days
-        InventoryBatch(
-            product_id=product.id,
-            batch_number="MEDIUM001",
-            initial_quantity=200,
-            current_quantity=150,
-            cost_per_unit=Decimal("10.00"),
-            selling_price_per_unit=Decimal("15.00"),
-            expiry_date=today + timedelta(days=60)
-        ),
-        # Low: expires in 120 days
-        InventoryBatch(
-            product_id=product.id,
-            batch_number="LOW001",
-            initial_quantity=300,
-            current_quantity=250,
-            cost_per_unit=Decimal("10.00"),
-            selling_price_per_unit=Decimal("15.00"),
-            expiry_date=today + timedelta(days=120)
-        ),
-        # Info: expires in 300 days
-        InventoryBatch(
-            product_id=product.id,
-            batch_number="INFO001",
-            initial_quantity=400,
-            current_quantity=350,
-            cost_per_unit=Decimal("10.00"),
-            selling_price_per_unit=Decimal("15.00"),
-            expiry_date=today + timedelta(days=300)
+async def sample_data():
+    """Create sample data once for the whole test session."""
+    async with AsyncSessionLocal() as db_session:
+        # Create category
+        category = ProductCategory(name="Test Category", description="Test category")
+        
+        # Create product
+        product = Product(
+            name="Test Medicine",
+            sku="TEST001",
+            cost_price=COST,
+            selling_price=PRICE,
+            category=category
         )
-    ]
-    
-    db_session.add_all(batches)
-    await db_session.commit()
+        
+        # Create batches with different expiry dates; the relationships let
+        # a single flush insert everything in dependency order
+        today = date.today()
+        batches = [
+            # Critical: expires in 3 days
+            InventoryBatch(
+                product=product,
+                batch_number="CRITICAL001",
+                initial_quantity=50,
+                current_quantity=30,
+                cost_per_unit=COST,
+                selling_price_per_unit=PRICE,
+                expiry_date=today + timedelta(days=3)
+            ),
+            # High: expires in 20 days
+            InventoryBatch(
+                product=product,
+                batch_number="HIGH001",
+                initial_quantity=100,
+                current_quantity=75,
+                cost_per_unit=COST,
+                selling_price_per_unit=PRICE,
+                expiry_date=today + timedelta(days=20)
+            ),
+            # Medium: expires in 60 days
+            InventoryBatch(
+                product=product,
+                batch_number="MEDIUM001",
+                initial_quantity=200,
+                current_quantity=150,
+                cost_per_unit=COST,
+                selling_price_per_unit=PRICE,
+                expiry_date=today + timedelta(days=60)
+            ),
+            # Low: expires in 120 days
+            InventoryBatch(
+                product=product,
+                batch_number="LOW001",
+                initial_quantity=300,
+                current_quantity=250,
+                cost_per_unit=COST,
+                selling_price_per_unit=PRICE,
+                expiry_date=today + timedelta(days=120)
+            ),
+            # Info: expires in 300 days
+            InventoryBatch(
+                product=product,
+                batch_number="INFO001",
+                initial_quantity=400,
+                current_quantity=350,
+                cost_per_unit=COST,
+                selling_price_per_unit=PRICE,
+                expiry_date=today + timedelta(days=300)
+            )
+        ]
+        
+        db_session.add_all([category, product] + batches)
+        await db_session.commit()
     
     return {
         'product': product,
         'category': category,
-        'batches': batches
+        'batches': batches,
+        'by_number': {batch.batch_number: batch for batch in batches}
     }
 
 
+@pytest.fixture(scope="session")
+async def all_alerts(sample_data):
+    """Unfiltered expiry alerts for the sample data, computed once."""
+    expiry_cache.clear()
+    async with AsyncSessionLocal() as session:
+        return await ExpiryService(session).get_expiry_alerts()
+
+
 class TestExpiryService:
     """Test cases for the expiry service."""
     
-    async def test_get_expiry_alerts(self, db_session, sample_data):
+    async def test_get_expiry_alerts(self, all_alerts):
         """Test getting expiry alerts."""
-        service = ExpiryService(db_session)
-        alerts = await service.get_expiry_alerts()
+        alerts = all_alerts
         
         # Should have 5 alerts (one for each batch)
         assert len(alerts) == 5
@@ -149,18 +136,97 @@ class TestExpiryService:
         assert alerts[0].alert_level == ExpiryAlertLevel.CRITICAL
         assert alerts[0].batch_number == "CRITICAL001"
     
-    async def test_priority_scoring(self, db_session, sample_data):
+    async def test_priority_scoring(self, all_alerts):
         """Test that alerts are properly prioritized."""
-        service = ExpiryService(db_session)
-        alerts = await service.get_expiry_alerts()
+        alerts = all_alerts
         
         # Alerts should be sorted by priority score (highest first)
         for i in range(len(alerts) - 1):
             assert alerts[i].priority_score >= alerts[i + 1].priority_score
+    
+    async def test_priority_favours_nearer_expiry(self, db_session, sample_data):
+        """Test that, at equal quantity and value, the more urgent batch ranks first."""
+        critical_batch = sample_data['by_number']['CRITICAL001']
+        
+        # Same size as the critical batch, but only at the high level
+        db_session.add(InventoryBatch(
+            product_id=sample_data['product'].id,
+            batch_number="HIGH002",
+            initial_quantity=critical_batch.initial_quantity,
+            current_quantity=critical_batch.current_quantity,
+            cost_per_unit=COST,
+            selling_price_per_unit=PRICE,
+            expiry_date=date.today() + timedelta(days=20)
+        ))
+        await db_session.flush()
         
-        # Critical alert should have highest priority
-        critical_alert = next(a for a in alerts if a.alert_level == ExpiryAlertLevel.CRITICAL)
-        assert critical_alert.priority_score == max(alert.priority_score for alert in alerts)
+        alerts = await ExpiryService(db_session).get_expiry_alerts(
+            alert_levels=[ExpiryAlertLevel.CRITICAL, ExpiryAlertLevel.HIGH]
+        )
+        by_number = {alert.batch_number: alert for alert in alerts}
+        
+        assert by_number["CRITICAL001"].alert_level == ExpiryAlertLevel.CRITICAL
+        assert by_number["HIGH002"].alert_level == ExpiryAlertLevel.HIGH
+        assert by_number["CRITICAL001"].priority_score > by_number["HIGH002"].priority_score
+    
+    async def test_keyset_pages_through_tied_scores(self, db_session, sample_data):
+        """Test that paging with ``after`` neither skips nor repeats tied alerts."""
+        product = sample_data['product']
+        expiry_date = date.today() + timedelta(days=45)
+        tied = [
+            InventoryBatch(
+                product_id=product.id,
+                batch_number=f"TIED{index:03d}",
+                initial_quantity=20,
+                current_quantity=20,
+                cost_per_unit=COST,
+                selling_price_per_unit=PRICE,
+                expiry_date=expiry_date
+            )
+            for index in range(5)
+        ]
+        db_session.add_all(tied)
+        await db_session.flush()
+        
+        service = ExpiryService(db_session)
+        expected = await service.get_expiry_alerts(product_id=product.id, limit=None)
+        
+        seen = []
+        after = None
+        while True:
+            page = await service.get_expiry_alerts(product_id=product.id, limit=2, after=after)
+            if not page:
+                break
+            seen.extend(page)
+            after = (page[-1].priority_score, page[-1].batch_id)
+        
+        assert [alert.batch_id for alert in seen] == [alert.batch_id for alert in expected]
+        
+        # Tied alerts come out in batch id order
+        tied_ids = [alert.batch_id for alert in seen if alert.batch_number.startswith("TIED")]
+        assert tied_ids == sorted(batch.id for batch in tied)
+        assert len({alert.priority_score for alert in seen if alert.batch_id in tied_ids}) == 1
+    
+    async def test_critical_route_is_not_paged(self, db_session, sample_data):
+        """Test that /alerts/critical returns more alerts than the /alerts page size."""
+        db_session.add_all([
+            InventoryBatch(
+                product_id=sample_data['product'].id,
+                batch_number=f"BULK{index:03d}",
+                initial_quantity=1,
+                current_quantity=1,
+                cost_per_unit=COST,
+                selling_price_per_unit=PRICE,
+                expiry_date=date.today() + timedelta(days=2)
+            )
+            for index in range(200)
+        ])
+        await db_session.flush()
+        
+        alerts = await get_critical_expiry_alerts(min_quantity=1, db=db_session)
+        
+        # The 200 added batches plus CRITICAL001
+        assert len(alerts) == 201
     
     async def test_expiry_summary(self, db_session, sample_data):
         """Test expiry summary statistics."""
@@ -184,17 +250,16 @@ class TestExpiryService:
         assert 'medium' in breakdown
         assert 'low' in breakdown
     
-    async def test_recommended_actions(self, db_session, sample_data):
+    async def test_recommended_actions(self, all_alerts):
         """Test that appropriate actions are recommended."""
-        service = ExpiryService(db_session)
-        alerts = await service.get_expiry_alerts()
+        by_level = {alert.alert_level: alert for alert in all_alerts}
         
         # Find critical alert
-        critical_alert = next(a for a in alerts if a.alert_level == ExpiryAlertLevel.CRITICAL)
+        critical_alert = by_level[ExpiryAlertLevel.CRITICAL]
         assert "URGENT" in critical_alert.recommended_action
         
         # Find high alert
-        high_alert = next(a for a in alerts if a.alert_level == ExpiryAlertLevel.HIGH)
+        high_alert = by_level[ExpiryAlertLevel.HIGH]
         assert len(high_alert.recommended_action) > 0
     
     async def test_mark_batch_expired(self, db_session, sample_data):
@@ -209,13 +274,45 @@ class TestExpiryService:
         success = await service.mark_batch_expired(critical_batch.id, user_id=1)
         assert success
         
-        # Refresh the batch
-        await db_session.refresh(critical_batch)
+        # Reload the batch in the test's session
+        critical_batch = await db_session.get(
+            InventoryBatch, critical_batch.id, populate_existing=True
+        )
         
         # Check that batch is marked as expired and quantity is zero
         assert critical_batch.is_expired
         assert critical_batch.current_quantity == 0
     
+    async def test_mark_batch_expired_invalidates_cache(self, db_session, sample_data):
+        """Test that cached summaries are refreshed after marking a batch expired."""
+        service = ExpiryService(db_session)
+        
+        before = await service.get_expiry_summary()
+        assert before['expiry_breakdown']['critical']['batches'] == 1
+        
+        critical_batch = sample_data['batches'][0]
+        assert await service.mark_batch_expired(critical_batch.id, user_id=1)
+        
+        after = await service.get_expiry_summary()
+        assert after['expiry_breakdown']['critical']['batches'] == 0
+        assert after['total_batches'] == before['total_batches'] - 1
+    
+    async def test_mark_batches_expired(self, db_session, sample_data):
+        """Test marking several batches as expired at once."""
+        service = ExpiryService(db_session)
+        batches = sample_data['batches'][:2]
+        
+        marked = await service.mark_batches_expired([b.id for b in batches], user_id=1)
+        assert marked == 2
+        
+        for batch in batches:
+            batch = await db_session.get(InventoryBatch, batch.id, populate_existing=True)
+            assert batch.is_expired
+            assert batch.current_quantity == 0
+        
+        # Already-empty batches are skipped
+        assert await service.mark_batches_expired([batches[0].id], user_id=1) == 0
+    
     async def test_minimum_quantity_filter(self, db_session, sample_data):
         """Test filtering alerts by minimum quantity."""
         service = ExpiryService(db_session)
@@ -227,19 +324,44 @@ class TestExpiryService:
         for alert in alerts:
             assert alert.current_quantity >= 100
     
-    async def test_estimated_value_calculation(self, db_session, sample_data):
+    async def test_estimated_value_calculation(self, sample_data, all_alerts):
         """Test that estimated values are calculated correctly."""
-        service = ExpiryService(db_session)
-        alerts = await service.get_expiry_alerts()
+        alerts = all_alerts
         
         for alert in alerts:
             # Find corresponding batch
-            batch = next(b for b in sample_data['batches'] 
-                        if b.batch_number == alert.batch_number)
+            batch = sample_data['by_number'][alert.batch_number]
             
             expected_value = float(batch.current_quantity * batch.selling_price_per_unit)
             assert abs(alert.estimated_value - expected_value) < 0.01
 
+    
+    async def test_estimated_value_is_rounded_to_cents(self, db_session, sample_data):
+        """Test that estimated values carry no floating point noise."""
+        # 7 * 2.33 is 16.310000000000002 in double precision
+        batch = InventoryBatch(
+            product_id=sample_data['product'].id,
+            batch_number="ROUND001",
+            initial_quantity=7,
+            current_quantity=7,
+            cost_per_unit=COST,
+            selling_price_per_unit=Decimal("2.33"),
+            expiry_date=date.today() + timedelta(days=45)
+        )
+        db_session.add(batch)
+        await db_session.flush()
+        
+        service = ExpiryService(db_session)
+        alerts = await service.get_alerts_for_product(sample_data['product'].id)
+        by_number = {alert.batch_number: alert for alert in alerts}
+        assert by_number["ROUND001"].estimated_value == 16.31
+        
+        summary = await service.get_expiry_summary()
+        expected_total = float(sum(
+            b.current_quantity * b.selling_price_per_unit for b in sample_data['batches']
+        ) + Decimal("16.31"))
+        assert summary['total_value'] == expected_total
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
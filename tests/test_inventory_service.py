@@ -0,0 +1,192 @@
+"""Tests for stock reservation, low stock and the stock movement log."""
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+
+from app.models.inventory import InventoryBatch, MovementType, StockMovement
+from app.models.product import Product
+from app.models.user import User
+from app.services.inventory_service import InventoryService, inventory_cache
+from app.services.product_service import ProductService
+
+
+async def add_product_with_batches(db_session, sku: str, quantities):
+    """Add a product with one batch per quantity, the first expiring soonest."""
+    product = Product(
+        name=f"Stock {sku}",
+        sku=sku,
+        cost_price=Decimal("1.00"),
+        selling_price=Decimal("2.00")
+    )
+    batches = [
+        InventoryBatch(
+            product=product,
+            batch_number=f"{sku}-B{index}",
+            initial_quantity=quantity,
+            current_quantity=quantity,
+            cost_per_unit=Decimal("1.00"),
+            selling_price_per_unit=Decimal("2.00"),
+            expiry_date=date.today() + timedelta(days=30 * (index + 1))
+        )
+        for index, quantity in enumerate(quantities)
+    ]
+    db_session.add_all([product] + batches)
+    await db_session.commit()
+    return product, batches
+
+
+async def reload(db_session, batch_ids):
+    """Re-read batches from the database."""
+    return [
+        await db_session.get(InventoryBatch, batch_id, populate_existing=True)
+        for batch_id in batch_ids
+    ]
+
+
+class TestReserveStock:
+    """Test cases for InventoryService.reserve_stock."""
+
+    async def test_reserves_across_batches_fifo(self, db_session):
+        """Test that a reservation takes the earliest-expiring batches first."""
+        product, batches = await add_product_with_batches(db_session, "RES001", [5, 3, 4])
+
+        reservations = await InventoryService(db_session).reserve_stock(product.id, 7)
+
+        assert [(r['batch_id'], r['quantity']) for r in reservations] == [
+            (batches[0].id, 5), (batches[1].id, 2)
+        ]
+        batches = await reload(db_session, [batch.id for batch in batches])
+        assert [batch.reserved_quantity for batch in batches] == [5, 2, 0]
+        assert [batch.current_quantity for batch in batches] == [5, 3, 4]
+
+    async def test_partial_shortage_leaves_batches_unchanged(self, db_session):
+        """Test that a shortfall spanning several batches reserves nothing."""
+        product, batches = await add_product_with_batches(db_session, "RES002", [5, 3])
+        # The failed reservation rolls back, expiring the loaded objects
+        batch_ids = [batch.id for batch in batches]
+
+        with pytest.raises(ValueError, match="Need 10, available 8"):
+            await InventoryService(db_session).reserve_stock(product.id, 10)
+
+        batches = await reload(db_session, batch_ids)
+        assert [batch.reserved_quantity for batch in batches] == [0, 0]
+        assert [batch.current_quantity for batch in batches] == [5, 3]
+
+
+class TestConfirmSale:
+    """Test cases for InventoryService.confirm_sale."""
+
+    async def test_decrements_each_batch(self, db_session):
+        """Test that a multi-line sale takes the right amount from every batch."""
+        service = InventoryService(db_session)
+        first, first_batches = await add_product_with_batches(db_session, "SALE001", [5, 6])
+        second, second_batches = await add_product_with_batches(db_session, "SALE002", [10])
+        batch_ids = [batch.id for batch in first_batches + second_batches]
+
+        reservations = await service.reserve_stock(first.id, 7)
+        reservations += await service.reserve_stock(second.id, 4)
+        # A second line for the same product draws on a batch already in the sale
+        reservations += await service.reserve_stock(first.id, 2)
+
+        await service.confirm_sale(reservations, user_id=1, sale_reference="SALE-TEST")
+
+        batches = await reload(db_session, batch_ids)
+        assert [batch.current_quantity for batch in batches] == [0, 2, 6]
+        assert [batch.reserved_quantity for batch in batches] == [0, 0, 0]
+
+    async def test_refuses_to_go_negative(self, db_session):
+        """Test that confirming more than a batch holds writes nothing."""
+        service = InventoryService(db_session)
+        product, batches = await add_product_with_batches(db_session, "SALE003", [5, 3])
+        batch_ids = [batch.id for batch in batches]
+
+        reservations = await service.reserve_stock(product.id, 8)
+        # Overstate the second batch's share, as if its stock had been written off
+        reservations[1]['quantity'] = 4
+
+        with pytest.raises(ValueError):
+            await service.confirm_sale(reservations, user_id=1, sale_reference="SALE-TEST")
+
+        batches = await reload(db_session, batch_ids)
+        assert [batch.current_quantity for batch in batches] == [5, 3]
+        assert [batch.reserved_quantity for batch in batches] == [5, 3]
+
+
+class TestLowStock:
+    """Test that low stock is judged on each product's total stock."""
+
+    async def test_split_stock_is_not_low(self, db_session):
+        """Test that low batches do not make a product low when its total is above the reorder point."""
+        service = InventoryService(db_session)
+        before = await service.get_inventory_summary()
+
+        # Reorder point is 5: each batch is low, but the total is not
+        product, _ = await add_product_with_batches(db_session, "LOW001", [3, 4])
+
+        inventory_cache.clear()
+        after = await service.get_inventory_summary()
+        low_products = await ProductService(db_session).get_low_stock_products()
+
+        assert after['low_stock_products'] == before['low_stock_products']
+        assert product.id not in {p.id for p in low_products}
+
+    async def test_product_without_batches_is_low(self, db_session):
+        """Test that a product with no active batches counts as low stock."""
+        service = InventoryService(db_session)
+        before = await service.get_inventory_summary()
+
+        product, _ = await add_product_with_batches(db_session, "LOW002", [])
+
+        inventory_cache.clear()
+        after = await service.get_inventory_summary()
+        low_products = await ProductService(db_session).get_low_stock_products()
+
+        assert after['low_stock_products'] == before['low_stock_products'] + 1
+        assert product.id in {p.id for p in low_products}
+
+
+class TestStockMovementLog:
+    """Test the plain-row stock movement listing."""
+
+    async def test_rows_include_movements_without_a_batch(self, db_session):
+        """Test the listed columns, including for a movement not tied to a batch."""
+        product, batches = await add_product_with_batches(db_session, "LOG001", [10])
+        user = User(
+            username="log-user",
+            email="log-user@example.com",
+            full_name="Log User",
+            hashed_password="x"
+        )
+        db_session.add_all([
+            StockMovement(
+                movement_type=MovementType.PURCHASE, quantity=10, product=product,
+                batch=batches[0], user=user, reference_number="PO-1"
+            ),
+            StockMovement(
+                movement_type=MovementType.ADJUSTMENT, quantity=-2, product=product,
+                user=user, notes="Count correction"
+            ),
+        ])
+        await db_session.commit()
+
+        rows = await InventoryService(db_session).get_stock_movement_log(product_id=product.id)
+
+        assert len(rows) == 2
+        assert set(rows[0]) == {
+            "id", "movement_type", "quantity", "reference_number", "notes", "created_at",
+            "product_id", "product_sku", "product_name", "batch_id", "batch_number", "username",
+        }
+        by_type = {row["movement_type"]: row for row in rows}
+        purchase = by_type[MovementType.PURCHASE]
+        adjustment = by_type[MovementType.ADJUSTMENT]
+        assert purchase["batch_number"] == "LOG001-B0"
+        assert purchase["reference_number"] == "PO-1"
+        assert adjustment["batch_id"] is None
+        assert adjustment["batch_number"] is None
+        assert adjustment["notes"] == "Count correction"
+        for row in rows:
+            assert row["product_sku"] == "LOG001"
+            assert row["product_name"] == "Stock LOG001"
+            assert row["username"] == "log-user"
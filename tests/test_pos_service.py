@@ -0,0 +1,186 @@
+"""Tests for POS carts, money handling and sale numbering."""
+
+import asyncio
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+
+from app.database import run_in_new_session
+from app.models.inventory import InventoryBatch
+from app.models.product import Product
+from app.models.sale import PaymentMethod, Sale
+from app.services import pos_service
+from app.services.pos_service import (
+    Cart, CartItem, CartStore, POSService, from_cents, to_cents
+)
+
+
+def cart_item(product_id: int, quantity: int, unit_price: str, discount: str = "0") -> CartItem:
+    """Build a cart item from money amounts given as strings."""
+    return CartItem(
+        product_id=product_id,
+        product_name=f"Product {product_id}",
+        sku=f"SKU{product_id}",
+        quantity=quantity,
+        unit_price_cents=to_cents(Decimal(unit_price)),
+        discount_cents=to_cents(Decimal(discount))
+    )
+
+
+class TestCents:
+    """Test the conversion between money amounts and integer cents."""
+
+    def test_to_cents_rounds_half_up(self):
+        """Test that half cents round away from zero, not to even."""
+        assert to_cents(Decimal("0.005")) == 1
+        assert to_cents(Decimal("0.0049")) == 0
+        assert to_cents(Decimal("0.125")) == 13
+        assert to_cents(Decimal("2.675")) == 268
+        assert to_cents(Decimal("19.99")) == 1999
+
+    def test_round_trip(self):
+        """Test that two-place amounts survive conversion unchanged."""
+        for amount in ("0.00", "0.01", "0.10", "1.05", "19.99", "12345.67"):
+            value = from_cents(to_cents(Decimal(amount)))
+            assert value == Decimal(amount)
+            assert str(value) == amount
+
+
+class TestCartTotals:
+    """Test the totals a cart computes in cents."""
+
+    def test_line_total_after_discount(self):
+        """Test that a line total is quantity times the rounded unit price, less discount."""
+        item = cart_item(1, quantity=3, unit_price="3.335", discount="0.015")
+
+        assert item.unit_price == Decimal("3.34")
+        assert item.discount_amount == Decimal("0.02")
+        assert item.line_total == Decimal("10.00")
+
+    def test_tax_on_discounted_total(self):
+        """Test that tax is charged after discounts and rounded half up."""
+        cart = Cart(
+            items=[
+                cart_item(1, quantity=3, unit_price="3.335", discount="0.015"),
+                cart_item(2, quantity=1, unit_price="0.125")
+            ],
+            discount_cents=to_cents(Decimal("0.49")),
+            tax_rate=Decimal("12.5")
+        )
+
+        assert cart.subtotal == Decimal("10.13")
+        assert cart.total_discount == Decimal("0.51")
+        # 12.5% of 9.64 is 1.205
+        assert cart.tax_amount == Decimal("1.21")
+        assert cart.total == Decimal("10.85")
+
+    async def test_percentage_discount_rounds_half_up(self):
+        """Test that percentage discounts round to the nearest cent, half up."""
+        service = POSService(db=None, carts=CartStore(ttl_seconds=60))
+        service.get_cart("session").add_item(cart_item(1, quantity=1, unit_price="0.25"))
+        service.get_cart("session").add_item(cart_item(2, quantity=1, unit_price="0.45"))
+
+        cart = await service.apply_discount("session", discount_percentage=Decimal("10"), product_id=1)
+        assert cart.find_item(1).discount_amount == Decimal("0.03")
+
+        cart = await service.apply_discount("session", discount_percentage=Decimal("5"))
+        # 5% of the 0.67 left after the item discount is 0.0335
+        assert cart.discount_amount == Decimal("0.03")
+        assert cart.total == Decimal("0.64")
+
+    async def test_sale_records_cart_totals(self, db_session):
+        """Test that a processed sale stores the cart's totals as two-place amounts."""
+        product = Product(
+            name="Cart Medicine",
+            sku="CART001",
+            cost_price=Decimal("0.50"),
+            selling_price=Decimal("1.25")
+        )
+        db_session.add(InventoryBatch(
+            product=product,
+            batch_number="CART-B1",
+            initial_quantity=10,
+            current_quantity=10,
+            cost_per_unit=Decimal("0.50"),
+            selling_price_per_unit=Decimal("1.25"),
+            expiry_date=date.today() + timedelta(days=365)
+        ))
+        await db_session.commit()
+
+        service = POSService(db_session, carts=CartStore(ttl_seconds=60))
+        cart = await service.add_to_cart("session", product.id, 3)
+        cart.tax_rate = Decimal("12.5")
+        await service.apply_discount("session", discount_amount=Decimal("0.11"))
+
+        sale = await service.process_sale(
+            "session", PaymentMethod.CASH, amount_paid=Decimal("5.00"), cashier_id=1
+        )
+        sale = await db_session.get(Sale, sale.id, populate_existing=True)
+
+        assert sale.subtotal == Decimal("3.75")
+        assert sale.discount_amount == Decimal("0.11")
+        # 12.5% of 3.64 is 0.455
+        assert sale.tax_amount == Decimal("0.46")
+        assert sale.total_amount == Decimal("4.10")
+        assert sale.change_given == Decimal("0.90")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Freeze the cart store's clock at a value the test can move."""
+    now = [1000.0]
+    monkeypatch.setattr(pos_service.time, "monotonic", lambda: now[0])
+    return now
+
+
+class TestCartStore:
+    """Test cart expiry and eviction in CartStore."""
+
+    def test_idle_carts_expire(self, clock):
+        """Test that a cart untouched for the TTL is replaced by a new one."""
+        store = CartStore(ttl_seconds=10)
+        idle = store.get("idle")
+        active = store.get("active")
+
+        clock[0] += 9
+        assert store.get("active") is active
+        clock[0] += 1
+        assert store.get("idle") is not idle
+        # Touching "active" at 1009 pushed its expiry to 1019
+        assert store.get("active") is active
+
+    def test_least_recently_used_cart_evicted(self, clock):
+        """Test that beyond max_carts the least recently touched cart is dropped."""
+        store = CartStore(ttl_seconds=10, max_carts=2)
+        first = store.get("first")
+        second = store.get("second")
+        assert store.get("first") is first
+
+        store.get("third")
+        assert store.discard("second") is None
+        assert store.discard("first") is first
+
+    def test_discard(self, clock):
+        """Test that a discarded cart is returned once and then gone."""
+        store = CartStore(ttl_seconds=10)
+        cart = store.get("session")
+
+        assert store.discard("session") is cart
+        assert store.discard("session") is None
+
+
+class TestSaleNumbers:
+    """Test the sale numbers handed out before sales commit."""
+
+    async def test_concurrent_numbers_are_distinct(self):
+        """Test that sales numbered at the same time never share a number."""
+        numbers = await asyncio.gather(*[
+            run_in_new_session(lambda session: POSService(session)._generate_sale_number())
+            for _ in range(5)
+        ])
+
+        assert len(set(numbers)) == 5
+        prefix = numbers[0][:-4]
+        sequences = sorted(int(number[len(prefix):]) for number in numbers)
+        assert sequences == list(range(sequences[0], sequences[0] + 5))
@@ -0,0 +1,110 @@
+"""Tests for product search."""
+
+from decimal import Decimal
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+
+from app.models.product import Product
+from app.services.product_service import ProductService, prefix_tsquery
+
+
+async def add_products(db_session, *products: dict):
+    """Add products built from field dicts, with prices filled in."""
+    rows = [
+        Product(cost_price=Decimal("1.00"), selling_price=Decimal("2.00"), **fields)
+        for fields in products
+    ]
+    db_session.add_all(rows)
+    await db_session.commit()
+    return rows
+
+
+async def search_skus(db_session, query: str) -> set:
+    """SKUs of the products a search returns."""
+    products = await ProductService(db_session).search_products(query)
+    return {product.sku for product in products}
+
+
+class TestSearchProducts:
+    """Test cases for ProductService.search_products."""
+
+    async def test_substring_stays_within_one_field(self, db_session):
+        """Test that a search does not match text spanning two fields."""
+        await add_products(
+            db_session,
+            {"name": "Pain Relief Tablets", "generic_name": "Ibuprofen", "sku": "SRCH001"},
+            {"name": "Ibuprofen Tablets", "sku": "SRCH002"},
+        )
+
+        assert await search_skus(db_session, "tablets ibu") == set()
+        assert await search_skus(db_session, "ibuprofen tab") == {"SRCH002"}
+
+    async def test_empty_query_lists_products_by_id(self, db_session):
+        """Test that a blank query returns products in ID order."""
+        added = await add_products(
+            db_session,
+            {"name": "Blank B", "sku": "SRCH010"},
+            {"name": "Blank A", "sku": "SRCH011"},
+        )
+        service = ProductService(db_session)
+
+        products = await service.search_products("  ")
+        assert [product.id for product in products] == sorted(product.id for product in products)
+        assert {product.id for product in added} <= {product.id for product in products}
+
+    async def test_short_query_matches_name_and_sku_prefixes(self, db_session):
+        """Test that one- and two-character queries match name or SKU prefixes."""
+        await add_products(
+            db_session,
+            {"name": "Zinc Syrup", "sku": "SRCH003"},
+            {"name": "Amoxicillin", "sku": "ZQ-004"},
+            {"name": "Vitamin Zq", "sku": "SRCH005"},
+        )
+
+        assert await search_skus(db_session, "zq") == {"ZQ-004"}
+        assert await search_skus(db_session, "zi") == {"SRCH003"}
+
+    async def test_substring_matches_any_field(self, db_session):
+        """Test that longer queries match inside the name, generic name, brand or SKU."""
+        await add_products(
+            db_session,
+            {"name": "Cough Mixture", "generic_name": "Dextromethorphan", "sku": "SRCH006"},
+            {"name": "Cold Relief", "brand_name": "Dextrocold", "sku": "SRCH007"},
+            {"name": "Multivitamin", "sku": "DEXTR-008"},
+        )
+
+        assert await search_skus(db_session, "DEXTRO") == {"SRCH006", "SRCH007"}
+        assert await search_skus(db_session, "tr-00") == {"DEXTR-008"}
+
+    async def test_stream_yields_every_match_in_id_order(self, db_session):
+        """Test that streaming across several chunks returns all matches in ID order."""
+        added = await add_products(
+            db_session,
+            *({"name": f"Streamed Syrup {index}", "sku": f"STRM{index:03d}"} for index in range(7)),
+            {"name": "Other Syrup", "sku": "SRCH012"},
+        )
+        service = ProductService(db_session)
+
+        streamed = [
+            product.id
+            async for product in service.search_products_stream("streamed syrup", chunk_size=3)
+        ]
+
+        assert streamed == sorted(product.id for product in added[:7])
+
+    def test_multi_word_query_uses_full_text_search_on_postgresql(self):
+        """Test that PostgreSQL gets a prefix tsquery for multi-word searches."""
+        session = SimpleNamespace(get_bind=lambda: SimpleNamespace(dialect=postgresql.dialect()))
+        statement = ProductService(session)._search_query("ibuprofen tab", None, True)
+        compiled = statement.compile(dialect=postgresql.dialect())
+
+        assert "@@ to_tsquery('english', %(terms)s)" in str(compiled)
+        assert compiled.params["terms"] == "ibuprofen & tab:*"
+
+    def test_prefix_tsquery(self):
+        """Test that search input becomes an AND of words, the last a prefix."""
+        assert prefix_tsquery("ibuprofen tab") == "ibuprofen & tab:*"
+        assert prefix_tsquery("  200mg  tab ") == "200mg & tab:*"
+        assert prefix_tsquery("o'neil & co:*") == "o & neil & co:*"
+        assert prefix_tsquery("- !") == ""
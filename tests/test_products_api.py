@@ -0,0 +1,64 @@
+"""Tests for the product API endpoints."""
+
+import sqlite3
+from decimal import Decimal
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+
+from app.api.products import (
+    ProductCreate, ProductUpdate, _product_integrity_detail, create_product, update_product
+)
+
+
+def new_product(**fields) -> ProductCreate:
+    """Build a product creation request with sensible defaults."""
+    values = {
+        "name": "API Medicine",
+        "sku": "API001",
+        "cost_price": Decimal("1.00"),
+        "selling_price": Decimal("2.00"),
+    }
+    values.update(fields)
+    return ProductCreate(**values)
+
+
+class TestProductIntegrityErrors:
+    """Test how integrity errors are reported when saving products."""
+
+    async def test_duplicate_sku(self, db_session):
+        """Test that a clashing SKU is reported as such."""
+        await create_product(new_product(), db=db_session)
+
+        with pytest.raises(HTTPException) as excinfo:
+            await create_product(new_product(name="Other"), db=db_session)
+        assert excinfo.value.status_code == 400
+        assert excinfo.value.detail == "SKU already exists"
+
+    async def test_duplicate_barcode(self, db_session):
+        """Test that a clashing barcode is reported as such."""
+        await create_product(new_product(barcode="5000001"), db=db_session)
+
+        with pytest.raises(HTTPException) as excinfo:
+            await create_product(new_product(sku="API002", barcode="5000001"), db=db_session)
+        assert excinfo.value.detail == "Barcode already exists"
+
+    async def test_duplicate_barcode_on_update(self, db_session):
+        """Test that updating a product to a taken barcode is reported."""
+        await create_product(new_product(barcode="5000001"), db=db_session)
+        other = await create_product(new_product(sku="API002"), db=db_session)
+
+        with pytest.raises(HTTPException) as excinfo:
+            await update_product(other.id, ProductUpdate(barcode="5000001"), db=db_session)
+        assert excinfo.value.status_code == 400
+        assert excinfo.value.detail == "Barcode already exists"
+
+    async def test_other_violations_are_not_duplicates(self):
+        """Test that non-unique integrity errors get a generic message."""
+        for message in (
+            "NOT NULL constraint failed: products.sku",
+            "FOREIGN KEY constraint failed",
+        ):
+            error = IntegrityError("INSERT", {}, sqlite3.IntegrityError(message))
+            assert _product_integrity_detail(error) == "Product data violates a database constraint"
@@ -0,0 +1,34 @@
+"""Tests for the index sync script."""
+
+from sqlalchemy import create_engine, text
+
+from app.database import Base
+from scripts.sync_indexes import RETIRED_INDEXES, sync_indexes
+
+
+def index_names(connection) -> set:
+    """Names of the indexes in a SQLite database."""
+    return set(connection.execute(
+        text("SELECT name FROM sqlite_master WHERE type = 'index'")
+    ).scalars())
+
+
+class TestSyncIndexes:
+    """Test cases for scripts/sync_indexes.py."""
+
+    def test_creates_missing_and_drops_retired(self):
+        """Test that an old database gets the model indexes and loses retired ones."""
+        sync_engine = create_engine("sqlite://")
+        with sync_engine.begin() as connection:
+            Base.metadata.create_all(connection)
+            expected = index_names(connection)
+            for name in ("ix_customer_email_lower", "ix_batches_live_expiry"):
+                connection.execute(text(f"DROP INDEX {name}"))
+            for name in RETIRED_INDEXES:
+                connection.execute(text(f"CREATE INDEX {name} ON inventory_batches (id)"))
+
+            sync_indexes(connection)
+            # A second run finds nothing to do
+            sync_indexes(connection)
+
+            assert index_names(connection) == expected